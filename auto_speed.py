@@ -6,8 +6,7 @@
 
 def load_config(config): # Called by klipper from [auto_speed]
     try:
-        from .autospeed import AutoSpeed
+        from .autospeed.main import AutoSpeed
     except ImportError:
         raise ImportError(f"Please re-run klipper_auto_speed/install.sh")
-    from .autospeed import AutoSpeed
     return AutoSpeed(config)
\ No newline at end of file
@@ -4,8 +4,30 @@
 #
 # This file may be distributed under the terms of the MIT license.
 
-from .funcs import *
-from .move import *
-from .wrappers import *
+# Nothing is imported until it's used, klippy only needs AutoSpeed from main
+_EXPORTS = {
+    "AutoSpeed": "main",
+    "ResultsWrapper": "wrappers",
+    "AttemptWrapper": "wrappers",
+    "Move": "move",
+    "MoveX": "move",
+    "MoveY": "move",
+    "MoveZ": "move",
+    "MoveDiagX": "move",
+    "MoveDiagY": "move",
+    "MoveSCV": "move",
+    "MoveCruise": "move",
+    "MoveStepper": "move",
+    "calculate_velocity": "funcs",
+    "calculate_accel": "funcs",
+    "calculate_distance": "funcs",
+    "calculate_diagonal": "funcs",
+    "calculate_graph": "funcs",
+    "calculate_step_velocity": "funcs",
+}
 
-from .main import AutoSpeed
\ No newline at end of file
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    import importlib
+    return getattr(importlib.import_module(f".{_EXPORTS[name]}", __name__), name)
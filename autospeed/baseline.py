@@ -0,0 +1,91 @@
+# Find your printers max speed before losing steps
+#
+# Copyright (C) 2024 Anonoei <dev@anonoei.com>
+#
+# This file may be distributed under the terms of the MIT license.
+
+import os
+import json
+import math
+import time
+
+class EndstopBaseline:
+    """Endstop repeatability between homes, in full steps, per axis
+
+    Saved with when it was measured, a fingerprint of the homing config and
+    the temperatures at the time, so later sessions can reuse it.
+    """
+    def __init__(self, path: str, valid_minutes: float, temp_tolerance: float, max_samples: int = 50):
+        self.path = path
+        self.valid_minutes = valid_minutes
+        self.temp_tolerance = temp_tolerance
+        self.max_samples = max_samples
+        self.time = 0.0
+        self.fingerprint = None
+        self.temps = {}
+        self.samples = {}
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r") as f:
+                saved = json.load(f)
+            self.time = saved["time"]
+            self.fingerprint = saved["fingerprint"]
+            self.temps = saved["temps"]
+            self.samples = saved["samples"]
+        except (ValueError, KeyError):
+            pass # Measure it again
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "w") as f:
+            json.dump({
+                "time": self.time,
+                "fingerprint": self.fingerprint,
+                "temps": self.temps,
+                "samples": self.samples,
+            }, f)
+
+    def age(self):
+        # Minutes since the baseline was measured
+        return (time.time() - self.time) / 60
+
+    def valid(self, fingerprint: str, temps: dict, axes: list):
+        if self.fingerprint != fingerprint or self.age() > self.valid_minutes:
+            return False
+        if any(len(self.samples.get(axis, [])) < 2 for axis in axes):
+            return False
+        for name, temp in temps.items():
+            if name in self.temps and abs(self.temps[name] - temp) > self.temp_tolerance:
+                return False
+        return True
+
+    def reset(self, fingerprint: str, temps: dict, samples: dict):
+        # A new measurement, valid for valid_minutes from now
+        self.fingerprint = fingerprint
+        self.samples = {}
+        self.time = time.time()
+        self.add(temps, samples)
+
+    def add(self, temps: dict, samples: dict):
+        # More endstop samples, the baseline still expires from when it was measured
+        for axis, values in samples.items():
+            self.samples[axis] = (self.samples.get(axis, []) + list(values))[-self.max_samples:]
+        self.temps = dict(temps)
+        self._save()
+
+    def stats(self, axis: str):
+        # Returns (mean, standard deviation)
+        samples = self.samples.get(axis, [])
+        if not samples:
+            return 0.0, 0.0
+        mean = sum(samples) / len(samples)
+        return mean, math.sqrt(sum((s - mean)**2 for s in samples) / len(samples))
+
+    def allowance(self, axis: str):
+        # Endstop jitter expected between two homes, added to max_missed
+        mean, spread = self.stats(axis)
+        return mean + 2 * spread
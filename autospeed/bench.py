@@ -0,0 +1,142 @@
+# Find your printers max speed before losing steps
+#
+# Copyright (C) 2024 Anonoei <dev@anonoei.com>
+#
+# This file may be distributed under the terms of the MIT license.
+
+import json
+import math
+import sqlite3
+import datetime as dt
+
+BUNDLE_VERSION = 1
+
+def fingerprint(raw_config: dict, kinematics: str, axis_limits: dict):
+    """What makes printers comparable: kinematics, size and motion steppers"""
+    fp = {
+        "kinematics": kinematics,
+        "size_x": axis_limits["x"]["dist"],
+        "size_y": axis_limits["y"]["dist"],
+    }
+    for axis in ("x", "y"):
+        name = f"stepper_{axis}"
+        stepper = raw_config.get(name, {})
+        fp[f"microsteps_{axis}"] = int(stepper.get("microsteps", 16))
+        fp[f"rotation_distance_{axis}"] = float(stepper.get("rotation_distance", 40))
+        fp[f"full_steps_{axis}"] = int(stepper.get("full_steps_per_rotation", 200))
+        fp[f"driver_{axis}"] = None
+        fp[f"run_current_{axis}"] = None
+        for section, options in raw_config.items():
+            if section.startswith("tmc") and section.endswith(f" {name}"):
+                fp[f"driver_{axis}"] = section.split()[0]
+                fp[f"run_current_{axis}"] = float(options.get("run_current", 0.0))
+    return fp
+
+def distance(a: dict, b: dict):
+    # 0.0 is the same printer, kinematics must match
+    if a["kinematics"] != b["kinematics"]:
+        return math.inf
+    dist = 0.0
+    for key in ("size_x", "size_y"):
+        dist += abs(a[key] - b[key]) / max(a[key], b[key], 1.0)
+    for axis in ("x", "y"):
+        dist += abs(math.log2(a[f"microsteps_{axis}"] / b[f"microsteps_{axis}"])) / 4
+        for key in (f"rotation_distance_{axis}", f"full_steps_{axis}"):
+            dist += abs(a[key] - b[key]) / max(a[key], b[key])
+        if a[f"driver_{axis}"] != b[f"driver_{axis}"]:
+            dist += 0.5
+        current_a, current_b = a[f"run_current_{axis}"], b[f"run_current_{axis}"]
+        if current_a and current_b:
+            dist += abs(current_a - current_b) / max(current_a, current_b)
+    return dist
+
+class BenchmarkDB:
+    def __init__(self, path: str):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "id INTEGER PRIMARY KEY, time TEXT, fingerprint TEXT, kinematics TEXT, "
+            "type TEXT, axis TEXT, value REAL, max_missed REAL, source TEXT, fixed REAL)"
+        )
+        # fixed is the velocity accel was found at (or the reverse), NULL when it followed the search
+        columns = [row[1] for row in self.db.execute("PRAGMA table_info(results)").fetchall()]
+        if "fixed" not in columns:
+            self.db.execute("ALTER TABLE results ADD COLUMN fixed REAL")
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+    def add(self, fp: dict, type: str, vals: dict, max_missed: float, source: str = "local", time: str = None, fixed: float = None):
+        if time is None:
+            time = f"{dt.datetime.now():%Y-%m-%d_%H:%M:%S}"
+        for axis, value in vals.items():
+            self.db.execute(
+                "INSERT INTO results (time, fingerprint, kinematics, type, axis, value, max_missed, source, fixed) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (time, json.dumps(fp, sort_keys=True), fp["kinematics"], type, axis, value, max_missed, source, fixed),
+            )
+        self.db.commit()
+
+    def _rows(self, kinematics: str, type: str, axis: str, fixed: float = None):
+        return self.db.execute(
+            "SELECT time, fingerprint, value FROM results WHERE kinematics = ? AND type = ? AND axis = ? AND fixed IS ? ORDER BY time",
+            (kinematics, type, axis, fixed),
+        ).fetchall()
+
+    def nearest(self, fp: dict, type: str, axis: str, fixed: float = None, count: int = 3, max_distance: float = 1.0):
+        # Returns [(distance, value)] of the closest printers, one result per printer
+        best = {}
+        for time, raw, value in self._rows(fp["kinematics"], type, axis, fixed):
+            dist = distance(fp, json.loads(raw))
+            if dist <= max_distance:
+                best[raw] = (dist, value) # Rows are in time order, keep the newest
+        return sorted(best.values())[:count]
+
+    def latest(self, fp: dict, type: str, axis: str, fixed: float = None):
+        # Newest result from this exact printer
+        key = json.dumps(fp, sort_keys=True)
+        for time, raw, value in reversed(self._rows(fp["kinematics"], type, axis, fixed)):
+            if raw == key:
+                return value
+        return None
+
+    def export_bundle(self, path: str):
+        rows = self.db.execute(
+            "SELECT time, fingerprint, type, axis, value, max_missed, source, fixed FROM results ORDER BY time"
+        ).fetchall()
+        bundle = {
+            "version": BUNDLE_VERSION,
+            "results": [
+                {
+                    "time": time,
+                    "fingerprint": json.loads(fp),
+                    "type": type,
+                    "axis": axis,
+                    "value": value,
+                    "max_missed": max_missed,
+                    "source": source,
+                    "fixed": fixed,
+                }
+                for time, fp, type, axis, value, max_missed, source, fixed in rows
+            ],
+        }
+        with open(path, "w") as f:
+            json.dump(bundle, f, indent=1)
+        return len(rows)
+
+    def import_bundle(self, path: str, source: str):
+        with open(path, "r") as f:
+            bundle = json.load(f)
+        if bundle.get("version", None) != BUNDLE_VERSION:
+            raise ValueError(f"Unsupported benchmark bundle version {bundle.get('version', None)}")
+        existing = set(self.db.execute("SELECT time, fingerprint, type, axis FROM results").fetchall())
+        count = 0
+        for r in bundle["results"]:
+            fp = json.dumps(r["fingerprint"], sort_keys=True)
+            if (r["time"], fp, r["type"], r["axis"]) in existing:
+                continue
+            self.add(r["fingerprint"], r["type"], {r["axis"]: r["value"]}, r["max_missed"], r.get("source", source), r["time"], r.get("fixed", None))
+            count += 1
+        return count
@@ -19,4 +19,9 @@ def calculate_diagonal(x: float, y: float):
     return math.sqrt(x**2 + y**2)
 
 def calculate_graph(velocity: float, slope: int):
-    return (10000/(velocity/slope))
\ No newline at end of file
+    return (10000/(velocity/slope))
+
+def calculate_step_velocity(step_rate: float, step_dist: float, factor: float):
+    # Toolhead velocity at which a stepper reaches step_rate,
+    #  factor is stepper distance per toolhead distance on the tested axis
+    return step_rate * step_dist / factor
@@ -0,0 +1,81 @@
+# Find your printers max speed before losing steps
+#
+# Copyright (C) 2024 Anonoei <dev@anonoei.com>
+#
+# This file may be distributed under the terms of the MIT license.
+
+import math
+
+# Print directions limits are projected to, in degrees from +X
+PROJECT_ANGLES = [0, 45, 90, 135]
+
+def _norm(vec):
+    return math.sqrt(sum(v*v for v in vec))
+
+def jacobian(stepper, coord: list, h: float = 1.0):
+    # Stepper distance per toolhead mm along X, Y and Z, around coord
+    row = []
+    for j in range(3):
+        hi = list(coord)
+        lo = list(coord)
+        hi[j] += h
+        lo[j] -= h
+        row.append((stepper.calc_position_from_coord(hi) - stepper.calc_position_from_coord(lo)) / (2*h))
+    return row
+
+def stepper_directions(steppers: list, coord: list):
+    """Find the toolhead direction that moves each stepper the most
+
+    Returns {axis: {"stepper", "dir", "factor", "jacobian"}}, where dir is a unit
+    vector, factor is stepper mm per toolhead mm along dir, and jacobian holds
+    every stepper's row so other steppers' load can be found too.
+    """
+    rows = {}
+    for stepper in steppers:
+        name = stepper.get_name()
+        if not name.startswith("stepper_"):
+            continue
+        rows[name[len("stepper_"):]] = jacobian(stepper, coord)
+    dirs = {}
+    seen = []
+    for key, row in rows.items():
+        factor = _norm(row)
+        if factor < 1e-9:
+            continue
+        direction = [v / factor for v in row]
+        # Steppers moving together, like multiple Z motors, share one test
+        if any(sum(a*b for a, b in zip(direction, other)) > 0.9999 for other in seen):
+            continue
+        seen.append(direction)
+        dirs[f"stepper_{key}"] = {
+            "stepper": key,
+            "dir": direction,
+            "factor": factor,
+            "jacobian": rows,
+        }
+    return dirs
+
+def stepper_loads(rows: dict, direction: list):
+    # Stepper mm per toolhead mm along direction, for every stepper it moves
+    loads = {}
+    for key, row in rows.items():
+        load = abs(sum(a*b for a, b in zip(row, direction)))
+        if load > 1e-9:
+            loads[key] = load
+    return loads
+
+def project(limits: dict, rows: dict, direction: list):
+    """Toolhead limit along direction from per stepper limits
+
+    limits are in stepper mm, the slowest stepper the direction moves wins.
+    """
+    length = _norm(direction)
+    direction = [v / length for v in direction]
+    projected = None
+    for key, load in stepper_loads(rows, direction).items():
+        if limits.get(key, None) is None: # Unknown without every stepper it moves
+            return None
+        limit = limits[key] / load
+        if projected is None or limit < projected:
+            projected = limit
+    return projected
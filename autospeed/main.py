@@ -4,25 +4,42 @@
 #
 # This file may be distributed under the terms of the MIT license.
 
+from __future__ import annotations # Annotations aren't evaluated, wrappers are only imported where they're used
+
 import os
+import json
+import math
 from time import perf_counter
 import datetime as dt
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .wrappers import AttemptWrapper
 
-from .funcs import calculate_graph, calculate_accel, calculate_velocity
-from .move import Move, MoveX, MoveY, MoveZ, MoveDiagX, MoveDiagY
-from .wrappers import ResultsWrapper, AttemptWrapper
+# MCU ticks one stepper needs per step, when max_step_rate isn't configured.
+#  Klipper's benchmarks range from about 20 on fast ARM MCUs to over 100 on AVRs,
+#  set mcu_ticks_per_step for slower MCUs. Steppers on the same MCU share it.
+MCU_TICKS_PER_STEP = 80
+# Longest a test move is stretched to reach the velocity it's testing
+MAX_STRETCH = 4.0
+# Attempts at or below this fraction of the search's upper bound refresh the endstop baseline,
+#  far enough from the limit that whatever they miss is endstop jitter
+BASELINE_FRACTION = 0.5
 
 class AutoSpeed:
     def __init__(self, config):
         self.config = config
         self.printer = config.get_printer()
+        self.reactor = self.printer.get_reactor()
         self.gcode = self.printer.lookup_object('gcode')
         self.gcode_move = self.printer.load_object(config, 'gcode_move')
 
         self.printer_kinematics = self.config.getsection("printer").get("kinematics")
         self.isolate_xy = self.printer_kinematics == 'cartesian' or self.printer_kinematics == 'corexz'
 
-        self.valid_axes = ["x", "y", "diag_x", "diag_y", "z"]
+        self.fixed_axes = ["x", "y", "diag_x", "diag_y", "z"]
+        self.valid_axes = list(self.fixed_axes) # Plus stepper_<name> once the kinematics are known
+        self.stepper_dirs = {} # Test directions from the kinematics, found after homing
         self.axes = self._parse_axis(config.get('axis', 'x, y' if self.isolate_xy else 'diag_x, diag_y'))
 
         self.default_axes = ''
@@ -35,22 +52,40 @@ class AutoSpeed:
         self.settling_home   = config.getboolean('settling_home',   default=True)
         self.max_missed      = config.getfloat(  'max_missed',      default=1.0)
         self.endstop_samples = config.getint(    'endstop_samples', default=3, minval=2)
+        self.variance_cache  = config.getfloat(  'variance_cache',  default=60.0, minval=0.0)
+        self.variance_temp   = config.getfloat(  'variance_temp',   default=5.0, above=0.0)
+        self.phase           = config.getboolean('phase',           default=False)
 
         self.accel_min  = config.getfloat('accel_min',  default=1000.0, above=1.0)
         self.accel_max  = config.getfloat('accel_max',  default=100000.0, above=self.accel_min)
         self.accel_accu = config.getfloat('accel_accu', default=0.05, above=0.0, below=1.0)
         self.scv        = config.getfloat('scv', default=5, above=1.0, below=50)
+        self.scv_min    = config.getfloat('scv_min', default=1.0, minval=1.0)
+        self.scv_max    = config.getfloat('scv_max', default=50.0, above=self.scv_min)
+        self.scv_accu   = config.getfloat('scv_accu', default=0.05, above=0.0, below=1.0)
 
         self.veloc_min  = config.getfloat('velocity_min',  default=50.0, above=1.0)
         self.veloc_max  = config.getfloat('velocity_max',  default=5000.0, above=self.veloc_min)
         self.veloc_accu = config.getfloat('velocity_accu', default=0.05, above=0.0, below=1.0)
 
         self.derate = config.getfloat('derate', default=0.8, above=0.0, below=1.0)
+        self.ladder = config.getint('ladder', default=1, minval=1)
+
+        self.physics_limit = config.getboolean('physics_limit', default=True)
+        self.max_step_rate = config.getfloat('max_step_rate', default=None, above=0.0)
+        self.mcu_ticks_per_step = config.getfloat('mcu_ticks_per_step', default=MCU_TICKS_PER_STEP, above=0.0)
+
+        self.shaper_limit   = config.getboolean('shaper_limit', default=True)
+        self.shaper_csv_dir = os.path.expanduser(config.get('shaper_csv_dir', default='/tmp'))
 
         self.validate_margin       = config.getfloat('validate_margin', default=self.margin, above=0.0)
         self.validate_inner_margin = config.getfloat('validate_inner_margin', default=20.0, above=0.0)
         self.validate_iterations   = config.getint(  'validate_iterations', default=50, minval=1)
 
+        self.soak_duration  = config.getfloat('soak_duration', default=60.0, above=0.0)
+        self.soak_interval  = config.getfloat('soak_interval', default=5.0, above=0.0)
+        self.chamber_sensor = config.get('chamber_sensor', default="temperature_sensor chamber")
+
         results_default = os.path.expanduser('~')
         for path in ( # Could be problematic if neither of these paths work
             os.path.dirname(self.printer.start_args['log_file']),
@@ -59,10 +94,26 @@ class AutoSpeed:
             if os.path.exists(path):
                 results_default = path
         self.results_dir = os.path.expanduser(config.get('results_dir',default=results_default))
+        # The profile is included from printer.cfg, so it's written next to it
+        self.config_dir = os.path.dirname(self.printer.start_args['config_file'])
+        self.profile_file = os.path.join(self.config_dir, os.path.expanduser(config.get('profile_file', default="auto_speed_profile.cfg")))
+        self.attempt_log = config.getboolean('attempt_log', default=True)
+        self.attempt_log_path = os.path.join(self.results_dir, "auto_speed_attempts.jsonl")
+        self.monitor_enabled = config.getboolean('monitor', default=False)
+        self.monitor_window  = config.getint('monitor_window', default=20, minval=2)
+        self.monitor_alert   = config.getfloat('monitor_alert', default=self.max_missed, above=0.0)
+        self.monitor = None
+        self.benchmark      = config.getboolean('benchmark', default=True)
+        self.benchmark_db   = os.path.expanduser(config.get('benchmark_db', default=os.path.join(self.results_dir, "auto_speed_benchmark.db")))
+        self.prior          = config.getboolean('prior', default=True)
+        self.prior_width    = config.getfloat('prior_width', default=0.25, above=0.0, below=1.0)
+        self.prior_distance = config.getfloat('prior_distance', default=1.0, above=0.0)
+        self.bench = None
+        self.last_results = {"accel": {}, "velocity": {}} # Maximums from the last ACCEL/VELOCITY
 
         self.toolhead = None
+        self.time_sync = 0.0
         self.printer.register_event_handler("klippy:connect", self.handle_connect)
-        self.printer.register_event_handler("homing:home_rails_end", self.handle_home_rails_end)
 
         self.gcode.register_command('AUTO_SPEED',
                                     self.cmd_AUTO_SPEED,
@@ -79,6 +130,30 @@ class AutoSpeed:
         self.gcode.register_command('AUTO_SPEED_GRAPH',
                                     self.cmd_AUTO_SPEED_GRAPH,
                                     desc=self.cmd_AUTO_SPEED_GRAPH_help)
+        self.gcode.register_command('AUTO_SPEED_SCV',
+                                    self.cmd_AUTO_SPEED_SCV,
+                                    desc=self.cmd_AUTO_SPEED_SCV_help)
+        self.gcode.register_command('AUTO_SPEED_CRUISE',
+                                    self.cmd_AUTO_SPEED_CRUISE,
+                                    desc=self.cmd_AUTO_SPEED_CRUISE_help)
+        self.gcode.register_command('AUTO_SPEED_SOAK',
+                                    self.cmd_AUTO_SPEED_SOAK,
+                                    desc=self.cmd_AUTO_SPEED_SOAK_help)
+        self.gcode.register_command('AUTO_SPEED_CHECK',
+                                    self.cmd_AUTO_SPEED_CHECK,
+                                    desc=self.cmd_AUTO_SPEED_CHECK_help)
+        self.gcode.register_command('AUTO_SPEED_MONITOR',
+                                    self.cmd_AUTO_SPEED_MONITOR,
+                                    desc=self.cmd_AUTO_SPEED_MONITOR_help)
+        self.gcode.register_command('AUTO_SPEED_REPLAY',
+                                    self.cmd_AUTO_SPEED_REPLAY,
+                                    desc=self.cmd_AUTO_SPEED_REPLAY_help)
+        self.gcode.register_command('AUTO_SPEED_EXPORT',
+                                    self.cmd_AUTO_SPEED_EXPORT,
+                                    desc=self.cmd_AUTO_SPEED_EXPORT_help)
+        self.gcode.register_command('AUTO_SPEED_IMPORT',
+                                    self.cmd_AUTO_SPEED_IMPORT,
+                                    desc=self.cmd_AUTO_SPEED_IMPORT_help)
         self.gcode.register_command('X_ENDSTOP_ACCURACY',
                                     self.cmd_X_ENDSTOP_ACCURACY,
                                     desc=self.cmd_AUTO_SPEED_GRAPH_help)
@@ -92,7 +167,13 @@ class AutoSpeed:
         self.level = None
 
         self.steppers = {}
+        self.rail_steppers = {} # Every stepper on the x, y and z rails, like stepper_z1
+        self.z_endstops = False # Each Z stepper homes to its own endstop
+        self.leveled = False
         self.axis_limits = {}
+        self.load = None
+        self.baseline = None
+        self.baseline_active = False # Endstop variance is known for the current config/temperatures
 
     def handle_connect(self):
         self.toolhead = self.printer.lookup_object('toolhead')
@@ -100,6 +181,10 @@ class AutoSpeed:
         self.th_accel = self.toolhead.max_accel/2
         self.th_veloc = self.toolhead.max_velocity/2
         self.th_scv = self.toolhead.square_corner_velocity
+        if self.monitor_enabled:
+            from .monitor import PrintMonitor
+            self.monitor = PrintMonitor(self, os.path.join(self.results_dir, "auto_speed_monitor.csv"), self.monitor_window, self.monitor_alert)
+            self.printer.register_event_handler("homing:home_rails_end", self.handle_home_rails_end)
 
         # Find and define leveling method
         if self.printer.lookup_object("screw_tilt_adjust", None) is not None:
@@ -112,59 +197,94 @@ class AutoSpeed:
             self.level = None
 
     def handle_home_rails_end(self, homing_state, rails):
+        # Only registered for the print monitor
+        if not self.steppers:
+            self._capture()
+        homed = []
+        for rail in rails:
+            for stepper in rail.get_steppers():
+                if stepper.get_name() in ["stepper_x", "stepper_y", "stepper_z"]:
+                    homed.append(stepper.get_name()[-1])
+        self.monitor.home(homed)
+
+    def _check_homed(self, gcmd):
+        homed_axes = self.toolhead.get_status(self.reactor.monotonic())["homed_axes"]
+        if not all(axis in homed_axes for axis in "xyz"):
+            raise gcmd.error(f"Printer must be homed first! Found {len(homed_axes)} homed axes.")
+        if not self.steppers:
+            self._capture()
+        if not len(self.steppers.keys()) == 3:
+            raise gcmd.error(f"Couldn't find stepper_x, stepper_y and stepper_z! Found {len(self.steppers.keys())} steppers. {self.printer_kinematics} kinematics aren't supported.")
+
+    def _capture(self):
         # Get axis min/max values
         # Get stepper microsteps
+        # Everything is read once from the kinematics, RESTART creates a new AutoSpeed
+        from .stats import LoadSampler
+        kin = self.toolhead.get_kinematics()
+        raw_config = self.printer.lookup_object('configfile').status_raw_config
+        mcu_steppers = {}
+        for stepper in kin.get_steppers():
+            mcu_steppers[stepper.get_mcu()] = mcu_steppers.get(stepper.get_mcu(), 0) + 1
+        for rail in getattr(kin, "rails", []):
+            pos_min, pos_max = rail.get_range()
+            position_endstop = rail.get_homing_info().position_endstop
+            rail_steppers = rail.get_steppers()
+            for stepper in rail_steppers:
+                name = stepper.get_name()
+                key = name[len("stepper_"):]
+                if name.startswith("stepper_") and key[:1] in ("x", "y", "z") and key[1:] in ("", *map(str, range(10))):
+                    self.rail_steppers[key] = {
+                        "axis": key[0],
+                        "microsteps": int(raw_config[name]["microsteps"]),
+                    }
+                    if key == "z" and len(rail_steppers) > 1:
+                        # Otherwise every Z stepper stops on the same endstop, and counts the same steps
+                        self.z_endstops = len(rail.get_endstops()) == len(rail_steppers)
+                # microsteps = (stepper._steps_per_rotation / full_steps / gearing)
+                if name in ["stepper_x", "stepper_y", "stepper_z"]:
+                    config = raw_config[name]
+                    microsteps = int(config["microsteps"])
+
+                    homing_retract_dist = config.get("homing_retract_dist", None)
+                    if homing_retract_dist is None:
+                        homing_retract_dist = 5 # This shouldn't be hardcoded
+                    homing_retract_dist = float(homing_retract_dist)
+                    second_homing_speed = config.get("second_homing_speed", None)
+                    if second_homing_speed is None:
+                        second_homing_speed = 5 # This shouldn't be hardcoded
+                    second_homing_speed = float(second_homing_speed)
+                    step_dist = stepper.get_step_dist()
+                    step_rate = self.max_step_rate
+                    if step_rate is None:
+                        # Every motion stepper on the MCU may step at once
+                        mcu = stepper.get_mcu()
+                        step_rate = mcu.seconds_to_clock(1.) / (self.mcu_ticks_per_step * mcu_steppers.get(mcu, 1))
+                    self.steppers[name[-1]] = [pos_min, pos_max, microsteps, homing_retract_dist, second_homing_speed, step_dist, step_rate, position_endstop]
+
+        for axis in self.steppers.keys():
+            self.axis_limits[axis] = {
+                "min": self.steppers[axis][0],
+                "max": self.steppers[axis][1],
+                "center": (self.steppers[axis][0] + self.steppers[axis][1]) / 2,
+                "dist": self.steppers[axis][1] - self.steppers[axis][0],
+                "home": self.steppers[axis][7]
+            }
         if not len(self.steppers.keys()) == 3:
-            for rail in rails:
-                pos_min, pos_max = rail.get_range()
-                for stepper in rail.get_steppers():
-                    name = stepper._name
-                    # microsteps = (stepper._steps_per_rotation / full_steps / gearing)
-                    if name in ["stepper_x", "stepper_y", "stepper_z"]:
-                        config = self.printer.lookup_object('configfile').status_raw_config[name]
-                        microsteps = int(config["microsteps"])
-
-                        homing_retract_dist = config.get("homing_retract_dist", None)
-                        if homing_retract_dist is None:
-                            homing_retract_dist = 5 # This shouldn't be hardcoded
-                        homing_retract_dist = float(homing_retract_dist)
-                        second_homing_speed = config.get("second_homing_speed", None)
-                        if second_homing_speed is None:
-                            second_homing_speed = 5 # This shouldn't be hardcoded
-                        second_homing_speed = float(second_homing_speed)
-                        self.steppers[name[-1]] = [pos_min, pos_max, microsteps, homing_retract_dist, second_homing_speed]
-
-            if self.steppers.get("x", None) is not None:
-                self.axis_limits["x"] = {
-                    "min": self.steppers["x"][0],
-                    "max": self.steppers["x"][1],
-                    "center": (self.steppers["x"][0] + self.steppers["x"][1]) / 2,
-                    "dist": self.steppers["x"][1] - self.steppers["x"][0],
-                    "home": self.gcode_move.homing_position[0]
-                }
-            if self.steppers.get("y", None) is not None:
-                self.axis_limits["y"] = {
-                    "min": self.steppers["y"][0],
-                    "max": self.steppers["y"][1],
-                    "center": (self.steppers["y"][0] + self.steppers["y"][1]) / 2,
-                    "dist": self.steppers["y"][1] - self.steppers["y"][0],
-                    "home": self.gcode_move.homing_position[1]
-                }
-            if self.steppers.get("z", None) is not None:
-                self.axis_limits["z"] = {
-                    "min": self.steppers["z"][0],
-                    "max": self.steppers["z"][1],
-                    "center": (self.steppers["z"][0] + self.steppers["z"][1]) / 2,
-                    "dist": self.steppers["z"][1] - self.steppers["z"][0],
-                    "home": self.gcode_move.homing_position[2]
-                }
+            return
+
+        self._init_stepper_dirs()
+        self.load = LoadSampler(self.printer)
+        from .baseline import EndstopBaseline
+        self.baseline = EndstopBaseline(os.path.join(self.results_dir, "auto_speed_variance.json"), self.variance_cache, self.variance_temp)
+        self.baseline_active = self.baseline.valid(self._baseline_fingerprint(), self._temperatures(), ["x", "y"])
 
     cmd_AUTO_SPEED_help = ("Automatically find your printer's maximum acceleration/velocity")
     def cmd_AUTO_SPEED(self, gcmd):
-        if not len(self.steppers.keys()) == 3:
-            raise gcmd.error(f"Printer must be homed first! Found {len(self.steppers.keys())} homed axes.")
+        self._check_homed(gcmd)
 
         validate = gcmd.get_int('VALIDATE', 0, minval=0, maxval=1)
+        find_scv = gcmd.get_int('FIND_SCV', 0, minval=0, maxval=1)
 
         self._prepare(gcmd) # Make sure the printer is level, [check endstop variance]
 
@@ -192,15 +312,19 @@ class AutoSpeed:
         respond += f"Recommended velocity: {veloc_results.vals['rec']:.0f}\n"
         self.gcode.respond_info(respond)
 
-        if validate:
+        if find_scv or validate:
             gcmd._params["ACCEL"] = accel_results.vals['rec']
             gcmd._params["VELOCITY"] = veloc_results.vals['rec']
+        if find_scv:
+            scv_results = self.cmd_AUTO_SPEED_SCV(gcmd)
+            gcmd._params["SCV"] = scv_results.vals['rec']
+        if validate:
             self.cmd_AUTO_SPEED_VALIDATE(gcmd)
 
     cmd_AUTO_SPEED_ACCEL_help = ("Automatically find your printer's maximum acceleration")
     def cmd_AUTO_SPEED_ACCEL(self, gcmd):
-        if not len(self.steppers.keys()) == 3:
-            raise gcmd.error(f"Printer must be homed first! Found {len(self.steppers.keys())} homed axes.")
+        from .wrappers import ResultsWrapper, AttemptWrapper
+        self._check_homed(gcmd)
         axes = self._parse_axis(gcmd.get("AXIS", self._axis_to_str(self.axes)))
 
         margin         = gcmd.get_float("MARGIN", self.margin, above=0.0)
@@ -214,11 +338,25 @@ class AutoSpeed:
         veloc = gcmd.get_float('VELOCITY', 1.0, above=1.0)
         scv =   gcmd.get_float('SCV', self.scv, above=1.0)
 
+        shaper = gcmd.get_int('SHAPER', self.shaper_limit, minval=0, maxval=1)
+        physics = gcmd.get_int('PHYSICS', self.physics_limit, minval=0, maxval=1)
+        prior = gcmd.get_int('PRIOR', self.prior, minval=0, maxval=1)
+        ladder = gcmd.get_int('LADDER', self.ladder, minval=1)
+
         respond = "AUTO SPEED finding maximum acceleration on"
         for axis in axes:
             respond += f" {axis.upper().replace('_', ' ')},"
         self.gcode.respond_info(respond[:-1])
 
+        shaper_limits = {}
+        if shaper:
+            shaper_limits = self._shaper_limits(axes)
+            if shaper_limits:
+                respond = "AUTO SPEED input shaper smoothing limits\n"
+                for axis, limit in shaper_limits.items():
+                    respond += f"| {axis.replace('_', ' ').upper()} max: {limit:.0f}\n"
+                self.gcode.respond_info(respond[:-1])
+
         rw = ResultsWrapper()
         start = perf_counter()
         for axis in axes:
@@ -232,22 +370,40 @@ class AutoSpeed:
             aw.max  = accel_max
             aw.veloc = veloc
             aw.scv = scv
+            aw.ladder = ladder
             self.init_axis(aw, axis)
-            rw.vals[aw.axis] = self.binary_search(aw)
+            if physics:
+                self._physics_bounds(aw)
+            rw.vals[aw.axis] = self._prior_search(aw) if prior else self.binary_search(aw)
+            rw.limited[aw.axis] = aw.limited
         rw.duration = perf_counter() - start
+        self._record_results("accel", rw.vals, max_missed, veloc if veloc != 1.0 else None)
 
         rw.name = "acceleration"
         respond = f"AUTO SPEED found maximum acceleration after {rw.duration:.2f}s\n"
         for axis in self.valid_axes:
             if rw.vals.get(axis, None) is not None:
-                respond += f"| {axis.replace('_', ' ').upper()} max: {rw.vals[axis]:.0f}\n"
+                respond += f"| {axis.replace('_', ' ').upper()} max: {rw.vals[axis]:.0f}"
+                if rw.limited.get(axis, None) is not None:
+                    respond += f" ({rw.limited[axis]})"
+                respond += "\n"
+        respond += self._stepper_projection(rw.vals)
         respond += f"\n"
 
         rw.derate(derate)
+        if shaper_limits:
+            rw.limit(shaper_limits)
         respond += f"Recommended values:\n"
         for axis in self.valid_axes:
             if rw.vals.get(axis, None) is not None:
-                respond += f"| {axis.replace('_', ' ').upper()} max: {rw.vals[axis]:.0f}\n"
+                respond += f"| {axis.replace('_', ' ').upper()} max: {rw.vals[axis]:.0f}"
+                shaper_max = rw.vals.get(f"limit_{axis}", None)
+                if shaper_max is not None:
+                    # Step loss was searched without the shaper's limit, the lower one wins
+                    step_loss = rw.vals[f"max_{axis}"] * derate
+                    respond += f" (step loss {step_loss:.0f}, input shaper {shaper_max:.0f}"
+                    respond += ", input shaper limited)" if shaper_max < step_loss else ")"
+                respond += "\n"
         respond += f"Recommended acceleration: {rw.vals['rec']:.0f}\n"
 
         self.gcode.respond_info(respond)
@@ -255,8 +411,8 @@ class AutoSpeed:
 
     cmd_AUTO_SPEED_VELOCITY_help = ("Automatically find your printer's maximum velocity")
     def cmd_AUTO_SPEED_VELOCITY(self, gcmd):
-        if not len(self.steppers.keys()) == 3:
-            raise gcmd.error(f"Printer must be homed first! Found {len(self.steppers.keys())} homed axes.")
+        from .wrappers import ResultsWrapper, AttemptWrapper
+        self._check_homed(gcmd)
         axes = self._parse_axis(gcmd.get("AXIS", self._axis_to_str(self.axes)))
 
         margin         = gcmd.get_float("MARGIN", self.margin, above=0.0)
@@ -270,6 +426,10 @@ class AutoSpeed:
         accel = gcmd.get_float('ACCEL', 1.0, above=1.0)
         scv =   gcmd.get_float('SCV', self.scv, above=1.0)
 
+        physics = gcmd.get_int('PHYSICS', self.physics_limit, minval=0, maxval=1)
+        prior = gcmd.get_int('PRIOR', self.prior, minval=0, maxval=1)
+        ladder = gcmd.get_int('LADDER', self.ladder, minval=1)
+
         respond = "AUTO SPEED finding maximum velocity on"
         for axis in axes:
             respond += f" {axis.upper().replace('_', ' ')},"
@@ -288,15 +448,24 @@ class AutoSpeed:
             aw.max  = veloc_max
             aw.accel = accel
             aw.scv = scv
+            aw.ladder = ladder
             self.init_axis(aw, axis)
-            rw.vals[aw.axis] = self.binary_search(aw)
+            if physics:
+                self._physics_bounds(aw)
+            rw.vals[aw.axis] = self._prior_search(aw) if prior else self.binary_search(aw)
+            rw.limited[aw.axis] = aw.limited
         rw.duration = perf_counter() - start
+        self._record_results("velocity", rw.vals, max_missed, accel if accel != 1.0 else None)
 
         rw.name = "velocity"
         respond = f"AUTO SPEED found maximum velocity after {rw.duration:.2f}s\n"
         for axis in self.valid_axes:
             if rw.vals.get(axis, None) is not None:
-                respond += f"| {axis.replace('_', ' ').upper()} max: {rw.vals[axis]:.0f}\n"
+                respond += f"| {axis.replace('_', ' ').upper()} max: {rw.vals[axis]:.0f}"
+                if rw.limited.get(axis, None) is not None:
+                    respond += f" ({rw.limited[axis]})"
+                respond += "\n"
+        respond += self._stepper_projection(rw.vals)
         respond += "\n"
 
         rw.derate(derate)
@@ -311,8 +480,7 @@ class AutoSpeed:
 
     cmd_AUTO_SPEED_VALIDATE_help = ("Validate your printer's acceleration/velocity don't miss steps")
     def cmd_AUTO_SPEED_VALIDATE(self, gcmd):
-        if not len(self.steppers.keys()) == 3:
-            raise gcmd.error(f"Printer must be homed first! Found {len(self.steppers.keys())} homed axes.")
+        self._check_homed(gcmd)
 
         max_missed   = gcmd.get_float('MAX_MISSED', self.max_missed, above=0.0)
         margin       = gcmd.get_float('VALIDATE_MARGIN', default=self.validate_margin, above=0.0)
@@ -323,25 +491,30 @@ class AutoSpeed:
         veloc = gcmd.get_float('VELOCITY', default=self.toolhead.max_velocity, above=0.0)
         scv =   gcmd.get_float('SCV', default=self.toolhead.square_corner_velocity, above=1.0)
 
+        gcode_file = gcmd.get('GCODE', None)
+        if gcode_file is not None:
+            return self._validate_gcode(gcmd, os.path.expanduser(gcode_file), accel, veloc, scv, margin, max_missed)
+
         respond = f"AUTO SPEED validating over {iterations} iterations\n"
         respond += f"Acceleration: {accel:.0f}\n"
         respond += f"Velocity: {veloc:.0f}\n"
         respond += f"SCV: {scv:.0f}"
         self.gcode.respond_info(respond)
         self._set_velocity(veloc, accel, scv)
-        valid, duration, missed_x, missed_y = self._validate(veloc, iterations, margin, small_margin, max_missed)
+        valid, duration, missed = self._validate(veloc, iterations, margin, small_margin, max_missed)
 
         respond = f"AUTO SPEED validated results after {duration:.2f}s\n"
         respond += f"Valid: {valid}\n"
-        respond += f"Missed X {missed_x:.2f}, Y {missed_y:.2f}"
+        respond += "Missed " + ", ".join(f"{key.upper()} {value:.2f}" for key, value in missed.items())
         self.gcode.respond_info(respond)
         return valid
 
     cmd_AUTO_SPEED_GRAPH_help = ("Graph your printer's maximum acceleration at given velocities")
     def cmd_AUTO_SPEED_GRAPH(self, gcmd):
+        from .funcs import calculate_graph
+        from .wrappers import AttemptWrapper
         import matplotlib.pyplot as plt # this may fail if matplotlib isn't installed
-        if not len(self.steppers.keys()) == 3:
-            raise gcmd.error(f"Printer must be homed first! Found {len(self.steppers.keys())} homed axes.")
+        self._check_homed(gcmd)
         axes = self._parse_axis(gcmd.get("AXIS", self._axis_to_str(self.axes)))
 
         margin     = gcmd.get_float("MARGIN", self.margin, above=0.0)
@@ -359,6 +532,12 @@ class AutoSpeed:
         accel_min_slope = gcmd.get_int('ACCEL_MIN_SLOPE', 100, minval=0)
         accel_max_slope = gcmd.get_int('ACCEL_MAX_SLOPE', 1800, minval=accel_min_slope)
 
+        model       = gcmd.get_int('MODEL', 0, minval=0, maxval=1)
+        tolerance   = gcmd.get_float('TOLERANCE', 0.1, above=0.0, below=1.0)
+        max_samples = gcmd.get_int('MAX_SAMPLES', 8, minval=3)
+
+        export = gcmd.get_int('PROFILE', 1, minval=0, maxval=1)
+
         veloc_step = (veloc_max - veloc_min)//(veloc_div - 1)
         velocs = [round((v * veloc_step) + veloc_min) for v in range(0, veloc_div)]
         respond = "AUTO SPEED graphing maximum accel from velocities on"
@@ -374,22 +553,34 @@ class AutoSpeed:
         aw.max_missed = max_missed
         aw.margin = margin
         aw.scv = scv
+        profile = {}
         for axis in axes:
             start = perf_counter()
             self.init_axis(aw, axis)
-            accels = []
-            accel_mins = []
-            accel_maxs = []
-            for veloc in velocs:
-                self.gcode.respond_info(f"AUTO SPEED graph {aw.axis} - v{veloc}")
-                aw.veloc = veloc
-                aw.min = round(calculate_graph(veloc, accel_min_slope))
-                aw.max = round(calculate_graph(veloc, accel_max_slope))
-                accel_mins.append(aw.min)
-                accel_maxs.append(aw.max)
-                accels.append(self.binary_search(aw))
-            plt.plot(velocs, accels, 'go-', label='measured')
-            plt.plot(velocs, [a*derate for a in accels], 'g-', label='derated')
+            if model:
+                tm, m_velocs, accels = self._graph_model(aw, veloc_min, veloc_max, accel_min_slope, accel_max_slope, tolerance, max_samples)
+                profile[aw.axis] = [tm.predict(veloc)[0] for veloc in velocs]
+            else:
+                m_velocs = velocs
+                accels = []
+                for veloc in velocs:
+                    self.gcode.respond_info(f"AUTO SPEED graph {aw.axis} - v{veloc}")
+                    aw.veloc = veloc
+                    aw.min = round(calculate_graph(veloc, accel_min_slope))
+                    aw.max = round(calculate_graph(veloc, accel_max_slope))
+                    accels.append(self.binary_search(aw))
+                profile[aw.axis] = accels
+            accel_mins = [round(calculate_graph(veloc, accel_min_slope)) for veloc in velocs]
+            accel_maxs = [round(calculate_graph(veloc, accel_max_slope)) for veloc in velocs]
+            if model:
+                curve = [veloc_min + (veloc_max - veloc_min) * i / 50 for i in range(0, 51)]
+                fitted = [tm.predict(veloc)[0] for veloc in curve]
+                plt.plot(m_velocs, accels, 'go', label='measured')
+                plt.plot(curve, fitted, 'k-', label='fitted')
+                plt.plot(curve, [a*derate for a in fitted], 'g-', label='derated')
+            else:
+                plt.plot(velocs, accels, 'go-', label='measured')
+                plt.plot(velocs, [a*derate for a in accels], 'g-', label='derated')
             plt.plot(velocs, accel_mins, 'b--', label='min')
             plt.plot(velocs, accel_maxs, 'r--', label='max')
             plt.legend(loc='upper right')
@@ -400,21 +591,357 @@ class AutoSpeed:
                 self.results_dir,
                 f"AUTO_SPEED_GRAPH_{dt.datetime.now():%Y-%m-%d_%H:%M:%S}_{aw.axis}.png"
             )
-            self.gcode.respond_info(f"Velocs: {velocs}")
+            self.gcode.respond_info(f"Velocs: {m_velocs}")
             self.gcode.respond_info(f"Accels: {accels}")
             self.gcode.respond_info(f"AUTO SPEED graph found max accel on {aw.axis} after {perf_counter() - start:.0f}s\nSaving graph to {filepath}")
             os.makedirs(self.results_dir, exist_ok=True)
             plt.savefig(filepath, bbox_inches='tight')
             plt.close()
 
+        if export:
+            self._export_profile(velocs, profile, derate)
+
+    cmd_AUTO_SPEED_SCV_help = ("Automatically find your printer's maximum square corner velocity")
+    def cmd_AUTO_SPEED_SCV(self, gcmd):
+        from .wrappers import ResultsWrapper, AttemptWrapper
+        self._check_homed(gcmd)
+
+        margin     = gcmd.get_float("MARGIN", self.margin, above=0.0)
+        derate     = gcmd.get_float('DERATE', self.derate, above=0.0, below=1.0)
+        max_missed = gcmd.get_float('MAX_MISSED', self.max_missed, above=0.0)
+
+        scv_min    = gcmd.get_float('SCV_MIN', self.scv_min, minval=1.0)
+        scv_max    = gcmd.get_float('SCV_MAX', self.scv_max, above=scv_min)
+        scv_accu   = gcmd.get_float('SCV_ACCU', self.scv_accu, above=0.0, below=1.0)
+        iterations = gcmd.get_int('SCV_ITERATIONS', 5, minval=1)
+
+        accel = gcmd.get_float('ACCEL', self.toolhead.max_accel, above=1.0)
+        veloc = gcmd.get_float('VELOCITY', self.toolhead.max_velocity, above=1.0)
+
+        respond = f"AUTO SPEED finding maximum square corner velocity\n"
+        respond += f"Acceleration: {accel:.0f}\n"
+        respond += f"Velocity: {veloc:.0f}"
+        self.gcode.respond_info(respond)
+
+        rw = ResultsWrapper()
+        start = perf_counter()
+        aw = AttemptWrapper()
+        aw.type = "scv"
+        aw.accuracy = scv_accu
+        aw.max_missed = max_missed
+        aw.margin = margin
+
+        aw.min = scv_min
+        aw.max = scv_max
+        aw.accel = accel
+        aw.veloc = veloc
+        self.init_axis(aw, "scv")
+        aw.move.iterations = iterations
+        rw.vals["scv"] = self.binary_search(aw)
+        rw.limited["scv"] = aw.limited
+        rw.duration = perf_counter() - start
+
+        rw.name = "scv"
+        respond = f"AUTO SPEED found maximum square corner velocity after {rw.duration:.2f}s\n"
+        respond += f"| SCV max: {rw.vals['scv']:.0f}"
+        if aw.limited is not None:
+            respond += f" ({aw.limited})"
+        respond += "\n\n"
+
+        rw.derate(derate)
+        respond += f"Recommended acceleration: {accel:.0f}\n"
+        respond += f"Recommended velocity: {veloc:.0f}\n"
+        respond += f"Recommended square corner velocity: {rw.vals['rec']:.1f}\n"
+        self.gcode.respond_info(respond)
+        return rw
+
+    cmd_AUTO_SPEED_CRUISE_help = ("Find the minimum_cruise_ratio with the fastest short moves that don't miss steps")
+    def cmd_AUTO_SPEED_CRUISE(self, gcmd):
+        from .wrappers import AttemptWrapper
+        self._check_homed(gcmd)
+
+        margin     = gcmd.get_float("MARGIN", self.margin, above=0.0)
+        max_missed = gcmd.get_float('MAX_MISSED', self.max_missed, above=0.0)
+
+        derate = gcmd.get_float('DERATE', self.derate, above=0.0, below=1.0)
+        accel  = gcmd.get_float('ACCEL', None, above=1.0)
+        veloc  = gcmd.get_float('VELOCITY', None, above=1.0)
+        scv    = gcmd.get_float('SCV', self.toolhead.square_corner_velocity, above=1.0)
+        # The zig-zag moves on x and y, every tested axis has to hold
+        if accel is None:
+            accel = self._found_limit(gcmd, "accel", self.axes, derate)
+        if veloc is None:
+            veloc = self._found_limit(gcmd, "velocity", self.axes, derate)
+
+        segment    = gcmd.get_float('SEGMENT', 10.0, above=0.0)
+        iterations = gcmd.get_int('CRUISE_ITERATIONS', 5, minval=1)
+        ratios = [float(r) for r in gcmd.get('RATIOS', "0.5,0.4,0.3,0.2,0.1,0.0").split(",") if r.strip()]
+        for ratio in ratios:
+            if not 0.0 <= ratio < 1.0:
+                raise gcmd.error(f"RATIOS must be between 0.0 and 1.0, got {ratio}")
+        # Gains are reported over the printer's own minimum_cruise_ratio, so it's always tested
+        configured = round(self._get_cruise_ratio(), 2)
+        if configured not in ratios:
+            ratios.append(configured)
+
+        respond = f"AUTO SPEED finding fastest minimum_cruise_ratio on {segment:.0f}mm segments\n"
+        respond += f"Acceleration: {accel:.0f}\n"
+        respond += f"Velocity: {veloc:.0f}\n"
+        respond += f"SCV: {scv:.0f}"
+        self.gcode.respond_info(respond)
+
+        aw = AttemptWrapper()
+        aw.type = "cruise"
+        aw.max_missed = max_missed
+        aw.margin = margin
+        aw.accel = accel
+        aw.veloc = veloc
+        aw.scv = scv
+        self.init_axis(aw, "cruise")
+        aw.move.segment = segment
+        aw.move.iterations = iterations
+
+        start = perf_counter()
+        results = []
+        # Lower ratios decelerate harder and are faster, stop at the first one missing steps
+        for ratio in sorted(ratios, reverse=True):
+            valid = self._boundary(aw, ratio)
+            speed = self._path_length(aw.move.Path()) / aw.move_print_time
+            results.append((ratio, valid, speed))
+            if not valid:
+                break
+
+        respond = f"AUTO SPEED tested minimum_cruise_ratio after {perf_counter() - start:.2f}s\n"
+        for ratio, valid, speed in results:
+            respond += f"| {ratio:.2f}: {speed:.0f}mm/s average{'' if valid else ', missed steps'}\n"
+        passed = [r for r in results if r[1]]
+        if not passed:
+            respond += f"Every ratio missed steps, lower ACCEL/VELOCITY and try again"
+            self.gcode.respond_info(respond)
+            return None
+        default = [r for r in results if r[0] == configured]
+        best = max(passed, key=lambda r: r[2])
+        respond += f"Recommended minimum_cruise_ratio: {best[0]:.2f}\n"
+        if default and default[0][1]:
+            respond += f"Average speed gain over the configured {configured:.2f}: {(best[2] / default[0][2] - 1) * 100:.1f}%"
+        elif default:
+            respond += f"The configured ratio {configured:.2f} missed steps"
+        else:
+            respond += f"The configured ratio {configured:.2f} wasn't tested, a higher ratio missed steps first"
+        self.gcode.respond_info(respond)
+        return best[0]
+
+    cmd_AUTO_SPEED_SOAK_help = ("Track your printer's maximum acceleration/velocity as it heats up")
+    def cmd_AUTO_SPEED_SOAK(self, gcmd):
+        self._check_homed(gcmd)
+        axes = self._parse_axis(gcmd.get("AXIS", self._axis_to_str(self.axes)))
+
+        margin     = gcmd.get_float("MARGIN", self.margin, above=0.0)
+        max_missed = gcmd.get_float('MAX_MISSED', self.max_missed, above=0.0)
+
+        accel      = gcmd.get_float('ACCEL', None, above=1.0)
+        veloc      = gcmd.get_float('VELOCITY', None, above=1.0)
+        derate     = gcmd.get_float('DERATE', self.derate, above=0.0, below=1.0)
+        accel_accu = gcmd.get_float('ACCEL_ACCU', self.accel_accu, above=0.0, below=1.0)
+        veloc_accu = gcmd.get_float('VELOCITY_ACCU', self.veloc_accu, above=0.0, below=1.0)
+        steps      = gcmd.get_int('STEPS', 5, minval=1)
+
+        duration = gcmd.get_float('DURATION', self.soak_duration, above=0.0)
+        interval = gcmd.get_float('INTERVAL', self.soak_interval, above=0.0)
+
+        limits = {}
+        for axis in axes:
+            limits[axis] = {
+                "accel": accel if accel is not None else self._found_limit(gcmd, "accel", [axis], derate),
+                "veloc": veloc if veloc is not None else self._found_limit(gcmd, "velocity", [axis], derate),
+            }
+
+        respond = f"AUTO SPEED soaking for {duration:.0f} minutes, checking every {interval:.0f} minutes on"
+        for axis in axes:
+            respond += f" {axis.upper().replace('_', ' ')},"
+        respond = respond[:-1] + "\n"
+        for axis in axes:
+            respond += f"| {axis.replace('_', ' ').upper()} start: a{limits[axis]['accel']:.0f} v{limits[axis]['veloc']:.0f}\n"
+        self.gcode.respond_info(respond[:-1])
+
+        rows = []
+        start = self.reactor.monotonic()
+        while True:
+            checked = self.reactor.monotonic()
+            row = {
+                "elapsed": (checked - start) / 60,
+                "temps": self._temperatures(),
+                "limits": {},
+            }
+            for axis in axes:
+                limits[axis]["accel"] = self._soak_check("accel", axis, limits[axis]["accel"], accel_accu, steps, margin, max_missed)
+                limits[axis]["veloc"] = self._soak_check("velocity", axis, limits[axis]["veloc"], veloc_accu, steps, margin, max_missed)
+                row["limits"][axis] = dict(limits[axis])
+            rows.append(row)
+
+            respond = f"AUTO SPEED soak at {row['elapsed']:.1f} minutes\n"
+            respond += "| " + ", ".join(f"{name} {temp:.1f}C" for name, temp in row["temps"].items()) + "\n"
+            for axis in axes:
+                respond += f"| {axis.replace('_', ' ').upper()} max: a{limits[axis]['accel']:.0f} v{limits[axis]['veloc']:.0f}\n"
+            self.gcode.respond_info(respond[:-1])
+
+            if checked - start + interval * 60 > duration * 60:
+                break
+            self.reactor.pause(checked + interval * 60)
+
+        filepath = os.path.join(self.results_dir, f"AUTO_SPEED_SOAK_{dt.datetime.now():%Y-%m-%d_%H:%M:%S}.csv")
+        os.makedirs(self.results_dir, exist_ok=True)
+        temp_names = sorted(set(name for row in rows for name in row["temps"].keys()))
+        with open(filepath, "w") as f:
+            f.write(",".join(["minutes"] + temp_names + [f"{axis}_{k}" for axis in axes for k in ("accel", "veloc")]) + "\n")
+            for row in rows:
+                vals = [f"{row['elapsed']:.2f}"]
+                vals += [f"{row['temps'][name]:.1f}" if name in row["temps"] else "" for name in temp_names]
+                vals += [f"{row['limits'][axis][k]:.0f}" for axis in axes for k in ("accel", "veloc")]
+                f.write(",".join(vals) + "\n")
+
+        ratios = []
+        respond = f"AUTO SPEED soak finished after {rows[-1]['elapsed']:.1f} minutes\n"
+        for axis in axes:
+            cold = rows[0]["limits"][axis]
+            hot = rows[-1]["limits"][axis]
+            a_ratio = hot["accel"] / cold["accel"]
+            v_ratio = hot["veloc"] / cold["veloc"]
+            ratios += [a_ratio, v_ratio]
+            respond += f"| {axis.replace('_', ' ').upper()} hot/cold: accel {a_ratio*100:.0f}%, velocity {v_ratio*100:.0f}%\n"
+        respond += f"Measured thermal derate: {min(ratios):.2f}\n"
+        respond += f"Saved soak results to {filepath}"
+        self.gcode.respond_info(respond)
+        return rows
+
+    cmd_AUTO_SPEED_CHECK_help = ("Quickly check previously found acceleration/velocity still don't miss steps")
+    def cmd_AUTO_SPEED_CHECK(self, gcmd):
+        from .wrappers import AttemptWrapper
+        self._check_homed(gcmd)
+        axes = self._parse_axis(gcmd.get("AXIS", self._axis_to_str(self.axes)))
+
+        margin     = gcmd.get_float("MARGIN", self.margin, above=0.0)
+        max_missed = gcmd.get_float('MAX_MISSED', self.max_missed, above=0.0)
+        accel      = gcmd.get_float('ACCEL', None, above=1.0)
+        veloc      = gcmd.get_float('VELOCITY', None, above=1.0)
+        search     = gcmd.get_int('SEARCH', 1, minval=0, maxval=1)
+        width      = gcmd.get_float('WIDTH', 0.5, above=0.0, below=1.0)
+
+        checks = []
+        for type, value, accuracy, m_min, m_max in (
+            ("accel", accel, self.accel_accu, self.accel_min, self.accel_max),
+            ("velocity", veloc, self.veloc_accu, self.veloc_min, self.veloc_max),
+            ):
+            for axis in axes:
+                limit = value if value is not None else self._last_result(type, axis)
+                if limit is not None:
+                    checks.append((type, axis, limit, accuracy, m_min, m_max))
+        if not checks:
+            raise gcmd.error("No previous results to check, run AUTO_SPEED or provide ACCEL/VELOCITY")
+
+        self.gcode.respond_info(f"AUTO SPEED checking {len(checks)} previous results")
+        start = perf_counter()
+        results = {}
+        for type, axis, limit, accuracy, m_min, m_max in checks:
+            aw = AttemptWrapper()
+            aw.type = type
+            aw.accuracy = accuracy
+            aw.max_missed = max_missed
+            aw.margin = margin
+            self.init_axis(aw, axis)
+
+            if not self._boundary(aw, limit):
+                status = "degraded"
+                aw.min, aw.max = max(m_min, limit * (1 - width)), limit
+            elif self._boundary(aw, limit * (1 + accuracy)):
+                status = "improved"
+                aw.min, aw.max = limit * (1 + accuracy), min(m_max, limit * (1 + width))
+            else:
+                status = "pass"
+            found = limit
+            if status != "pass" and search and aw.max > aw.min * (1 + accuracy):
+                found = self.binary_search(aw)
+                self._record_results(type, {axis: found}, max_missed)
+            results[(type, axis)] = (status, limit, found)
+
+        respond = f"AUTO SPEED checked previous results after {perf_counter() - start:.2f}s\n"
+        for (type, axis), (status, limit, found) in results.items():
+            respond += f"| {axis.replace('_', ' ').upper()} {type} {limit:.0f}: {status}"
+            if status != "pass" and found != limit:
+                respond += f", now {found:.0f}"
+            respond += "\n"
+        self.gcode.respond_info(respond)
+        return results
+
+    cmd_AUTO_SPEED_MONITOR_help = ("Show missed steps measured between the homes of previous prints")
+    def cmd_AUTO_SPEED_MONITOR(self, gcmd):
+        if self.monitor is None:
+            raise gcmd.error("The print monitor is disabled, set 'monitor: True' in [auto_speed]")
+        if gcmd.get_int('RESET', 0, minval=0, maxval=1):
+            self.monitor.reset()
+            self.gcode.respond_info("AUTO SPEED monitor reset")
+            return
+        stats = self.monitor.stats()
+        if not stats:
+            self.gcode.respond_info("AUTO SPEED monitor hasn't measured any prints yet, they need to home twice")
+            return
+        respond = f"AUTO SPEED monitor over the last {len(self.monitor.records)} prints\n"
+        for axis, (mean, most, older, recent) in stats.items():
+            respond += f"| {axis.upper()} missed: mean {mean:.2f}, max {most:.2f}, older {older:.2f}, recent {recent:.2f}\n"
+        last = self.monitor.records[-1]
+        respond += f"Last print used a{last['accel']:.0f}/v{last['velocity']:.0f}/scv{last['scv']:.0f}\n"
+        trending = self.monitor.trending()
+        if trending:
+            respond += f"Trending up on {', '.join(axis.upper() for axis in trending)}, consider lowering acceleration to {self.monitor.suggestion():.0f}"
+        else:
+            respond += "No upward trend"
+        self.gcode.respond_info(respond)
+        return stats
+
+    cmd_AUTO_SPEED_REPLAY_help = ("Compare search strategies offline against recorded attempts")
+    def cmd_AUTO_SPEED_REPLAY(self, gcmd):
+        from .replay import load_attempts, compare, format_results, STRATEGIES
+        path = os.path.expanduser(gcmd.get('FILE', self.attempt_log_path))
+        if not os.path.exists(path):
+            raise gcmd.error(f"No attempt log found at '{path}'")
+        trials     = gcmd.get_int('TRIALS', 200, minval=1)
+        max_missed = gcmd.get_float('MAX_MISSED', None, above=0.0)
+        strategies = [s for s in gcmd.get('STRATEGIES', ",".join(STRATEGIES.keys())).lower().replace(" ", "").split(",") if s in STRATEGIES]
+        if not strategies:
+            raise gcmd.error(f"No valid STRATEGIES, choose from {', '.join(STRATEGIES.keys())}")
+
+        attempts = load_attempts(path)
+        if not attempts:
+            raise gcmd.error(f"Attempt log '{path}' is empty")
+        self.gcode.respond_info(f"AUTO SPEED replaying {len(attempts)} attempts over {trials} trials")
+        results = compare(attempts, strategies, trials, max_missed)
+        self.gcode.respond_info(format_results(results))
+        return results
+
+    cmd_AUTO_SPEED_EXPORT_help = ("Export the benchmark database as a portable result bundle")
+    def cmd_AUTO_SPEED_EXPORT(self, gcmd):
+        path = os.path.expanduser(gcmd.get('FILE', os.path.join(self.results_dir, f"AUTO_SPEED_BENCHMARK_{dt.datetime.now():%Y-%m-%d_%H:%M:%S}.json")))
+        count = self._bench_db().export_bundle(path)
+        self.gcode.respond_info(f"AUTO SPEED exported {count} benchmark results to {path}")
+
+    cmd_AUTO_SPEED_IMPORT_help = ("Import a result bundle into the benchmark database")
+    def cmd_AUTO_SPEED_IMPORT(self, gcmd):
+        path = os.path.expanduser(gcmd.get('FILE'))
+        if not os.path.exists(path):
+            raise gcmd.error(f"No benchmark bundle found at '{path}'")
+        try:
+            count = self._bench_db().import_bundle(path, gcmd.get('SOURCE', os.path.basename(path)))
+        except (ValueError, KeyError) as e:
+            raise gcmd.error(f"Couldn't import '{path}': {e}")
+        self.gcode.respond_info(f"AUTO SPEED imported {count} benchmark results from {path}")
+
     # -------------------------------------------------------
     #
     #     Internal Helpers
     #
     # -------------------------------------------------------
     def _prepare(self, gcmd):
-        if not len(self.steppers.keys()) == 3:
-            raise gcmd.error(f"Printer must be homed first! Found {len(self.steppers.keys())} homed axes.")
+        self._check_homed(gcmd)
 
         start = perf_counter()
         # Level the printer if it's not leveled
@@ -428,23 +955,14 @@ class AutoSpeed:
     def _level(self, gcmd):
         level = gcmd.get_int('LEVEL', 1, minval=0, maxval=1)
 
+        self.leveled = False
         if level == 0:
             return
         if self.level is None:
             return
 
-        lookup = None
-        name = None
-        if self.level == "STA":
-            lookup = "screw_tilt_adjust"
-            name = "SCREWS_TILT_CALCULATE"
-        elif self.level == "ZT":
-            lookup = "z_tilt"
-            name = "Z_TILT_ADJUST"
-        elif self.level == "QGL":
-            lookup = "quad_gantry_level"
-            name = "QUAD_GANTRY_LEVEL"
-        else:
+        lookup, name = self._level_method()
+        if lookup is None:
             raise gcmd.error(f"Unknown leveling method '{self.level}'.")
         lm = self.printer.lookup_object(lookup)
         if lm.z_status.applied is False:
@@ -452,8 +970,21 @@ class AutoSpeed:
             self.gcode._process_commands([name], False)
             if lm.z_status.applied is False:
                 raise gcmd.error(f"Failed to level printer! Please manually ensure your printer is level.")
+        # Screw tilt is adjusted by hand, there's nothing to keep
+        self.leveled = self.level in ("ZT", "QGL")
+
+    def _level_method(self):
+        # Returns (object, command) for the leveling method
+        if self.level == "STA":
+            return "screw_tilt_adjust", "SCREWS_TILT_CALCULATE"
+        elif self.level == "ZT":
+            return "z_tilt", "Z_TILT_ADJUST"
+        elif self.level == "QGL":
+            return "quad_gantry_level", "QUAD_GANTRY_LEVEL"
+        return None, None
 
     def _variance(self, gcmd):
+        from .phase import FULL_STEPS_PER_CYCLE
         variance        = gcmd.get_int('VARIANCE', 1, minval=0, maxval=1)
 
         max_missed      = gcmd.get_float('MAX_MISSED', self.max_missed, above=0.0)
@@ -464,26 +995,315 @@ class AutoSpeed:
         if variance == 0:
             return
 
-        self.gcode.respond_info(f"AUTO SPEED checking endstop variance over {endstop_samples} samples")
-
-        if settling_home:
-            self.toolhead.wait_moves()
-            self._home(True, True, False)
-
         axes = self._parse_axis(gcmd.get("AXIS", self._axis_to_str(self.axes)))
 
         check_x = 'x' in axes if self.isolate_xy else True
         check_y = 'y' in axes if self.isolate_xy else True
+        checked = [axis for axis, check in (("x", check_x), ("y", check_y)) if check]
+
+        fingerprint = self._baseline_fingerprint()
+        temps = self._temperatures()
+        if self.variance_cache > 0 and self.baseline.valid(fingerprint, temps, checked):
+            respond = f"AUTO SPEED using endstop variance from {self.baseline.age():.0f} minutes ago"
+        else:
+            self.gcode.respond_info(f"AUTO SPEED checking endstop variance over {endstop_samples} samples")
+
+            if settling_home:
+                self.toolhead.wait_moves()
+                self._home(True, True, False)
+
+            # Check endstop variance
+            endstops = self._endstop_variance(endstop_samples, x=check_x, y=check_y)
+
+            x_max = max(endstops["x"]) if check_x else 0
+            y_max = max(endstops["y"]) if check_y else 0
+            respond = f"AUTO SPEED endstop variance:\nMissed X:{x_max:.2f} steps, Y:{y_max:.2f} steps"
+            if endstops["jitter"]["x"] or endstops["jitter"]["y"]:
+                x_jitter = max(endstops["jitter"]["x"], default=0)
+                y_jitter = max(endstops["jitter"]["y"], default=0)
+                respond += f"\nPhase jitter X:{x_jitter:.2f} steps, Y:{y_jitter:.2f} steps"
+            self.baseline.reset(fingerprint, temps, {axis: endstops["jitter"][axis] or endstops[axis] for axis in checked})
+        self.baseline_active = True
+
+        for axis in checked:
+            mean, spread = self.baseline.stats(axis)
+            respond += f"\n{axis.upper()} jitter {mean:.2f}+/-{spread:.2f} steps, fails above {max_missed + self._allowance(axis):.2f} missed"
+        self.gcode.respond_info(respond)
+
+        noisy = [axis.upper() for axis in checked if self._allowance(axis) >= FULL_STEPS_PER_CYCLE]
+        if noisy:
+            # Sensorless homing can vary this much, MAX_MISSED is the user's call
+            self.gcode.respond_info(f"AUTO SPEED warning: {', '.join(noisy)} endstops vary by more than {FULL_STEPS_PER_CYCLE} full steps, lost steps below that can't be told apart from jitter. Tune your steppers/homing macro if you aren't using sensorless homing.")
+
+    def _baseline_fingerprint(self):
+        # Endstop variance only carries over while homing is set up the same way
+        return json.dumps({
+            "kinematics": self.printer_kinematics,
+            "steppers": {axis: self.steppers[axis] for axis in ("x", "y")},
+        }, sort_keys=True)
+
+    def _refresh_baseline(self, start_steps, stop_steps, home: list):
+        # Add a post test home to the endstop variance, it still expires from when it was measured
+        if not self.baseline_active:
+            return
+        samples = {}
+        for axis, homed in zip(("x", "y"), home):
+            if homed and axis in start_steps and axis in stop_steps:
+                missed, jitter = self._missed(axis, start_steps, stop_steps)
+                samples[axis] = [missed if jitter is None else jitter]
+        if samples:
+            self.baseline.add(self._temperatures(), samples)
+
+    def _allowance(self, axis):
+        # Expected endstop jitter, so max_missed doesn't have to cover it
+        if not self.baseline_active or axis not in ("x", "y"):
+            return 0.0
+        return self.baseline.allowance(axis)
+
+    def _export_profile(self, velocs, profile: dict, derate: float):
+        from .profile import build_profile, write_profile
+
+        table = build_profile(velocs, profile, derate)
+        filepath = self.profile_file
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        write_profile(filepath, table, list(profile.keys()))
+
+        respond = f"AUTO SPEED saved velocity/accel profile to {filepath}\n"
+        for veloc, accel in table:
+            respond += f"| v{veloc:.0f}: a{accel:.0f}\n"
+        respond += f"Add [include {os.path.relpath(filepath, self.config_dir)}] to your printer.cfg, and call AUTO_SPEED_PROFILE VELOCITY=<speed> before each feature"
+        self.gcode.respond_info(respond)
+        return table
+
+    def _bench_db(self):
+        if self.bench is None:
+            from .bench import BenchmarkDB
+            os.makedirs(os.path.dirname(self.benchmark_db), exist_ok=True)
+            self.bench = BenchmarkDB(self.benchmark_db)
+        return self.bench
+
+    def _fingerprint(self):
+        from .bench import fingerprint
+        raw_config = self.printer.lookup_object('configfile').status_raw_config
+        return fingerprint(raw_config, self.printer_kinematics, self.axis_limits)
+
+    def _record_results(self, type, vals: dict, max_missed: float, fixed: float = None):
+        # Store the measured maximums, before derating
+        #  fixed is the velocity accel was found at (or the reverse), only free searches are the printer's limits
+        if fixed is None:
+            self.last_results[type].update(vals)
+        if not self.benchmark:
+            return
+        self._bench_db().add(self._fingerprint(), type, vals, max_missed, fixed=fixed)
 
-        # Check endstop variance
-        endstops = self._endstop_variance(endstop_samples, x=check_x, y=check_y)
+    def _init_stepper_dirs(self):
+        from .kinematics import stepper_directions
+        kin = self.toolhead.get_kinematics()
+        center = [self.axis_limits[axis]["center"] for axis in ("x", "y", "z")]
+        self.stepper_dirs = stepper_directions(kin.get_steppers(), center)
+        self.valid_axes = self.fixed_axes + [axis for axis in self.stepper_dirs.keys() if axis not in self.fixed_axes]
+
+    def _stepper_projection(self, vals: dict):
+        # Stepper limits in stepper mm, and what they allow along print directions
+        from .kinematics import project, PROJECT_ANGLES
+        limits = {}
+        rows = None
+        for axis, direction in self.stepper_dirs.items():
+            if vals.get(axis, None) is None:
+                continue
+            limits[direction["stepper"]] = vals[axis] * direction["factor"]
+            rows = direction["jacobian"]
+        if not limits:
+            return ""
+        respond = "Stepper limits\n"
+        for name, limit in limits.items():
+            respond += f"| {name.upper()} max: {limit:.0f}\n"
+        projected = ""
+        for angle in PROJECT_ANGLES:
+            rad = math.radians(angle)
+            limit = project(limits, rows, [math.cos(rad), math.sin(rad), 0.0])
+            if limit is not None:
+                projected += f"| {angle} degrees max: {limit:.0f}\n"
+        if projected:
+            respond += "Projected to print directions\n" + projected
+        return respond
+
+    def _last_result(self, type, axis):
+        # Maximum from this session, or the newest one saved for this printer
+        if self.last_results[type].get(axis, None) is not None:
+            return self.last_results[type][axis]
+        if not self.benchmark or not os.path.exists(self.benchmark_db):
+            return None
+        return self._bench_db().latest(self._fingerprint(), type, axis)
+
+    def _found_limit(self, gcmd, type, axes, derate):
+        # Derated maximum AUTO_SPEED found, the slowest of axes
+        limits = [self._last_result(type, axis) for axis in axes]
+        limits = [limit for limit in limits if limit is not None]
+        if not limits:
+            param = "ACCEL" if type == "accel" else "VELOCITY"
+            raise gcmd.error(f"No {type} found for {self._axis_to_str(axes)} yet, run AUTO_SPEED_{param} or provide {param}")
+        return min(limits) * derate
+
+    def _axis_steppers(self, axis):
+        # Returns the steppers a test axis moves, and their distance per toolhead distance
+        corexy = self.printer_kinematics in ("corexy", "limited_corexy", "hybrid_corexy")
+        if axis == "z":
+            return ["z"], 1.0
+        if axis in ("scv", "cruise"): # Zig-zags move on x and y
+            return ["x", "y"], 1.0
+        if axis in self.stepper_dirs:
+            from .kinematics import stepper_loads
+            loads = stepper_loads(self.stepper_dirs[axis]["jacobian"], self.stepper_dirs[axis]["dir"])
+            return [name for name in loads.keys() if name in self.steppers], max(loads.values())
+        if axis in ("x", "y"):
+            return ([axis], 1.0) if not corexy else (["x", "y"], 1.0)
+        # Diagonals move one corexy motor at sqrt(2), or both cartesian motors at 1/sqrt(2)
+        return ["x", "y"], math.sqrt(2) if corexy else 1/math.sqrt(2)
+
+    def _path_length(self, path):
+        length = 0.0
+        for start, end in zip(path[:-1], path[1:]):
+            length += math.sqrt(sum((e - s)**2 for s, e in zip(start, end) if s is not None and e is not None))
+        return length
+
+    def _step_rate(self, aw: AttemptWrapper):
+        from .funcs import calculate_step_velocity
+        # Highest stepper step rate during the attempt, as a fraction of its limit
+        names, factor = self._axis_steppers(aw.axis)
+        return max(
+            aw.veloc / calculate_step_velocity(self.steppers[name][6], self.steppers[name][5], factor)
+            for name in names
+        )
+
+    def _physics_bounds(self, aw: AttemptWrapper):
+        from .funcs import calculate_accel, calculate_velocity, calculate_step_velocity
+        # Keep the search inside what the steppers/MCU can physically do
+        names, factor = self._axis_steppers(aw.axis)
+        veloc_max = min(
+            calculate_step_velocity(self.steppers[name][6], self.steppers[name][5], factor)
+            for name in names
+        )
+        min_dist = 5.0 + aw.margin # Move._validate's shortest move
+        if aw.type == "velocity":
+            ceiling = veloc_max
+            if aw.accel != 1.0: # Fixed accel can't reach past this within the axis
+                # Accelerating then decelerating over d peaks at sqrt(a*d), like calculate_distance
+                ceiling = min(ceiling, calculate_velocity(aw.accel, aw.move.max_dist))
+        elif aw.veloc == 1.0:
+            # Accel tests follow with velocity = calculate_velocity(accel, dist)/2.5
+            ceiling = calculate_accel(veloc_max * 2.5, min_dist)
+        else:
+            if aw.veloc > veloc_max:
+                self.gcode.respond_info(f"AUTO SPEED warning: v{aw.veloc:.0f} on {aw.axis} is above the v{veloc_max:.0f} step rate limit")
+            return
+        if ceiling <= aw.min * (1 + aw.accuracy):
+            self.gcode.respond_info(f"AUTO SPEED warning: {aw.type} on {aw.axis} physical limit {ceiling:.0f} is below the minimum {aw.min:.0f}, ignoring it")
+            return
+        if ceiling < aw.max:
+            self.gcode.respond_info(f"AUTO SPEED limiting {aw.type} on {aw.axis} to {ceiling:.0f} from step rate/travel")
+            aw.max = ceiling
+
+    def _shaper_limits(self, axes):
+        # Max accel before input shaper smoothing ruins prints, per test axis
+        from .shaper import read_config, find_csvs, get_shaper, shaper_max_accel
+
+        shapers = find_csvs(self.shaper_csv_dir)
+        # Configured shapers take priority over resonance test results
+        shapers.update(read_config(self.printer.lookup_object('configfile').status_raw_config))
+        limits = {}
+        for axis, (shaper_type, freq, damping) in shapers.items():
+            shaper = get_shaper(shaper_type, freq, damping)
+            if shaper is not None:
+                limits[axis] = shaper_max_accel(shaper, self.th_scv)
+
+        axis_limits = {}
+        for axis in axes:
+            if axis in ("x", "y") and axis in limits:
+                axis_limits[axis] = limits[axis]
+            elif axis in ("diag_x", "diag_y") and limits:
+                axis_limits[axis] = min(limits.values())
+            elif axis in self.stepper_dirs:
+                moved = [limits[a] for a, u in zip(("x", "y"), self.stepper_dirs[axis]["dir"]) if abs(u) > 1e-9 and a in limits]
+                if moved:
+                    axis_limits[axis] = min(moved)
+        return axis_limits
+
+    def _soak_check(self, type, axis, value, accuracy, steps, margin, max_missed):
+        from .wrappers import AttemptWrapper
+        # Verify value still passes, stepping down until it does
+        aw = AttemptWrapper()
+        aw.type = type
+        aw.accuracy = accuracy
+        aw.max_missed = max_missed
+        aw.margin = margin
+        aw.scv = self.scv
+        self.init_axis(aw, axis)
+        for _ in range(steps):
+            if self._boundary(aw, value):
+                break
+            value *= 1 - accuracy
+        return value
+
+    def _temperatures(self):
+        eventtime = self.reactor.monotonic()
+        temps = {}
+        for name, obj in self.printer.lookup_objects():
+            # Only some TMC drivers (tmc2240) report their temperature
+            if name.startswith("tmc") and hasattr(obj, "get_status"):
+                temp = obj.get_status(eventtime).get("temperature", None)
+                if temp is not None:
+                    temps[name.split()[-1]] = temp
+        for name, lookup in (("bed", "heater_bed"), ("chamber", self.chamber_sensor)):
+            obj = self.printer.lookup_object(lookup, None)
+            if obj is not None:
+                temps[name] = obj.get_status(eventtime)["temperature"]
+        return temps
+
+    def _graph_model(self, aw: AttemptWrapper, veloc_min, veloc_max, min_slope, max_slope, tolerance, max_samples):
+        from .funcs import calculate_graph
+        from .model import TorqueModel
+
+        tm = TorqueModel(aw.accuracy)
+        candidates = [round(veloc_min + (veloc_max - veloc_min) * i / 19) for i in range(0, 20)]
+        seeds = [round(veloc_min), round(veloc_max), round((veloc_min + veloc_max) / 2)]
+        while len(tm.velocs) < max_samples:
+            if seeds:
+                veloc = seeds.pop(0)
+            elif tm.converged(candidates, tolerance):
+                break
+            else:
+                veloc = tm.next_velocity(candidates)
 
-        x_max = max(endstops["x"]) if check_x else 0
-        y_max = max(endstops["y"]) if check_y else 0
-        self.gcode.respond_info(f"AUTO SPEED endstop variance:\nMissed X:{x_max:.2f} steps, Y:{y_max:.2f} steps")
+            s_min = round(calculate_graph(veloc, min_slope))
+            s_max = round(calculate_graph(veloc, max_slope))
+            aw.veloc = veloc
+            aw.min, aw.max = s_min, s_max
+            if len(tm.velocs) >= 3:
+                # Only search where the model says the limit can be
+                predict, std = tm.predict(veloc)
+                aw.min = round(max(s_min, predict - 3*std))
+                aw.max = round(min(s_max, predict + 3*std))
+                if aw.max <= aw.min * (1 + aw.accuracy):
+                    aw.min, aw.max = s_min, s_max
+            self.gcode.respond_info(f"AUTO SPEED graph model {aw.axis} - v{veloc} a{aw.min:.0f}-{aw.max:.0f}")
+            accel = self.binary_search(aw)
+            if (aw.min, aw.max) != (s_min, s_max) and not (aw.min * (1 + aw.accuracy) < accel < aw.max * (1 - aw.accuracy)):
+                # Limit is at the edge of the narrowed bracket, the model was wrong here
+                aw.min, aw.max = s_min, s_max
+                accel = self.binary_search(aw)
+            tm.add(veloc, accel)
+            self.gcode.respond_info(f"AUTO SPEED graph model {aw.axis}: {tm}, worst uncertainty {max(tm.uncertainty(v) for v in candidates)*100:.1f}%")
+
+        respond = f"AUTO SPEED graph model on {aw.axis} after {len(tm.velocs)} samples\n"
+        respond += f"| a(v) = {tm.a0:.0f} / (1 + v/{tm.vc:.0f})\n"
+        for veloc in candidates[::4] + [candidates[-1]]:
+            predict, std = tm.predict(veloc)
+            respond += f"| v{veloc}: a{predict:.0f} +-{2*std:.0f}\n"
+        self.gcode.respond_info(respond[:-1])
 
-        if x_max >= max_missed or y_max >= max_missed:
-            raise gcmd.error(f"Please increase MAX_MISSED (currently {max_missed}), or tune your steppers/homing macro.")
+        order = sorted(range(len(tm.velocs)), key=lambda i: tm.velocs[i])
+        return tm, [tm.velocs[i] for i in order], [tm.accels[i] for i in order]
 
     # -------------------------------------------------------
     #
@@ -496,8 +1316,12 @@ class AutoSpeed:
         raw_axes = raw_axes.split(',')
         axes = []
         for axis in raw_axes:
-            if axis in self.valid_axes:
+            if axis == "steppers" and self.stepper_dirs:
+                axes += [a for a in self.stepper_dirs.keys() if a not in axes]
+            elif axis in self.valid_axes:
                 axes.append(axis)
+            elif axis.startswith("stepper") and not self.stepper_dirs:
+                axes.append(axis) # Checked once the kinematics are known
         return axes
 
     def _axis_to_str(self, raw_axes):
@@ -508,6 +1332,7 @@ class AutoSpeed:
         return axes
 
     def init_axis(self, aw: AttemptWrapper, axis):
+        from .move import MoveX, MoveY, MoveZ, MoveDiagX, MoveDiagY, MoveSCV, MoveCruise, MoveStepper
         aw.axis = axis
         if axis == "diag_x":
             aw.move = MoveDiagX()
@@ -519,100 +1344,246 @@ class AutoSpeed:
             aw.move = MoveY()
         elif axis == "z":
             aw.move = MoveZ()
+        elif axis == "scv":
+            aw.move = MoveSCV()
+        elif axis == "cruise":
+            aw.move = MoveCruise()
+        elif axis in self.stepper_dirs:
+            aw.move = MoveStepper(self.stepper_dirs[axis]["dir"])
         aw.move.Init(self.axis_limits, aw.margin, self.isolate_xy)
 
     def binary_search(self, aw: AttemptWrapper):
+        from .stats import classify
         aw.time_start = perf_counter()
+        aw.run = f"{dt.datetime.now():%Y-%m-%d_%H:%M:%S.%f}"
         m_min = aw.min
         m_max = aw.max
         m_var = m_min + (m_max-m_min) // 3
 
-        if aw.veloc == 0.0:
-            aw.veloc = 1.0
-        if aw.accel == 0.0:
-            aw.accel = 1.0
-
-        if aw.type in ("accel", "graph"): # stat is velocity, var is accel
-            m_stat = aw.veloc
-            o_veloc = aw.veloc
-            if o_veloc == 1.0:
-                aw.accel = calculate_accel(aw.veloc, aw.move.max_dist)
-            aw.move.Calc(self.axis_limits, m_stat, m_var, aw.margin)
-
-        elif aw.type in ("velocity"): # stat is accel, var is velocity
-            m_stat = aw.accel
-            o_accel = aw.accel
-            if o_accel == 1.0:
-                aw.veloc = calculate_velocity(aw.accel, aw.move.max_dist)
-            aw.move.Calc(self.axis_limits, m_var, m_stat, aw.margin)
+        self._init_search(aw, m_var)
 
         measuring = True
         measured_val = None
+        ladder = aw.ladder > 1
+        laddered = False # A ladder failed
         aw.tries = 0
         aw.home_steps, aw.move_time_prehome = self._prehome(aw.move.home)
         while measuring:
             aw.tries += 1
-            if aw.type in ("accel", "graph"):
-                if o_veloc == 1.0:
-                    m_stat = aw.veloc = calculate_velocity(m_var, aw.move.dist)/2.5
-                aw.accel = m_var
-                aw.move.Calc(self.axis_limits, m_stat, m_var, aw.margin)
-            elif aw.type == "velocity":
-                if o_accel == 1.0:
-                    m_stat = aw.accel = calculate_accel(m_var, aw.move.dist)*2.5
-                aw.veloc = m_var
-                aw.move.Calc(self.axis_limits, m_var, m_stat, aw.margin)
-            #self.gcode.respond_info(str(aw))
-
-            valid = self._attempt(aw)
-
-            if aw.type in ("accel", "graph"):
-                veloc = m_stat
-                accel = m_var
-            elif aw.type in ("velocity"):
-                veloc = m_var
-                accel = m_stat
-            respond = f"AUTO SPEED {aw.type} on {aw.axis} try {aw.tries} ({aw.time_last:.2f}s)\n"
-            respond += f"Moved {aw.move_dist - aw.margin:.2f}mm at a{accel:.0f}/v{veloc:.0f} after {aw.move_time_prehome:.2f}/{aw.move_time:.2f}/{aw.move_time_posthome:.2f}s\n"
-            respond += f"Missed"
-            if aw.move.home[0]:
-                respond += f" X {aw.missed['x']:.2f},"
-            if aw.move.home[1]:
-                respond += f" Y {aw.missed['y']:.2f},"
-            if aw.move.home[2]:
-                respond += f" Z {aw.missed['z']:.2f},"
-            self.gcode.respond_info(respond[:-1])
+            aw.search_max = m_max
+            values = self._ladder(aw, m_var, m_max) if ladder else [m_var]
+            valid = self._attempt(aw, values)
+            self._respond_attempt(aw)
+            if not valid:
+                aw.limited = classify(aw.load)
+
+            if len(values) > 1 and not valid:
+                # Some rung failed, bisect one value at a time for the rest of the search,
+                #  laddering again would keep retesting the first rung on its own
+                m_max = values[-1]
+                ladder = False
+                laddered = True
+                continue
+            m_var = values[-1]
+
             if measured_val is not None:
                 if m_var * (1 + aw.accuracy) > m_max or m_var * (1 - aw.accuracy) < m_min:
                     measuring = False
             measured_val = m_var
             if valid:
                 m_min = m_var
+                ladder = aw.ladder > 1 and not laddered
             else:
                 m_max = m_var
             m_var = (m_min + m_max)//2
 
         aw.time_total = perf_counter() - aw.time_start
+        aw.run = None # Later single attempts, like AUTO_SPEED_CHECK's, aren't part of this search
+        aw.search_max = None
         return m_var
 
-    def _attempt(self, aw: AttemptWrapper):
-        timeAttempt = perf_counter()
+    def _prior_search(self, aw: AttemptWrapper):
+        # Narrow the search around results from the most similar printers
+        if not self.benchmark or not os.path.exists(self.benchmark_db):
+            return self.binary_search(aw)
+        fixed = None # Only compare to results found with the same fixed velocity/accel
+        if aw.type == "accel" and aw.veloc not in (0.0, 1.0):
+            fixed = aw.veloc
+        elif aw.type == "velocity" and aw.accel not in (0.0, 1.0):
+            fixed = aw.accel
+        neighbors = self._bench_db().nearest(self._fingerprint(), aw.type, aw.axis, fixed, max_distance=self.prior_distance)
+        if not neighbors:
+            return self.binary_search(aw)
+        vals = [value for _, value in neighbors]
+        m_min, m_max = aw.min, aw.max
+        lo = max(m_min, min(vals) * (1 - self.prior_width))
+        hi = min(m_max, max(vals) * (1 + self.prior_width))
+        if hi <= lo * (1 + aw.accuracy):
+            return self.binary_search(aw)
+        self.gcode.respond_info(f"AUTO SPEED {aw.type} on {aw.axis} using {len(vals)} similar printers, searching {lo:.0f} to {hi:.0f}")
+
+        aw.min, aw.max = lo, hi
+        result = self.binary_search(aw)
+        # The limit may be outside the prior, search the rest of the original range
+        if hi < m_max and result * (1 + aw.accuracy) > hi:
+            self.gcode.respond_info(f"AUTO SPEED {aw.type} on {aw.axis} reached the top of the prior, searching {result:.0f} to {m_max:.0f}")
+            aw.min, aw.max = result, m_max
+            result = self.binary_search(aw)
+        elif lo > m_min and result * (1 - aw.accuracy) < lo:
+            self.gcode.respond_info(f"AUTO SPEED {aw.type} on {aw.axis} reached the bottom of the prior, searching {m_min:.0f} to {result:.0f}")
+            aw.min, aw.max = m_min, result
+            result = self.binary_search(aw)
+        aw.min, aw.max = m_min, m_max
+        return result
+
+    def _ladder(self, aw: AttemptWrapper, m_var, m_max):
+        # The next bisection points if every attempt passes, in ascending order
+        values = [m_var]
+        while len(values) < aw.ladder:
+            value = (values[-1] + m_max)//2
+            if value <= values[-1] * (1 + aw.accuracy):
+                break
+            values.append(value)
+        return values
+
+    def _boundary(self, aw: AttemptWrapper, value: float):
+        # Single attempt at value, set up the same way binary_search does
+        fixed = self._init_search(aw, value)
+        if aw.home_steps is None:
+            aw.home_steps, aw.move_time_prehome = self._prehome(aw.move.home)
+        aw.tries += 1
+        self._calc_attempt(aw, value, fixed)
+        valid = self._attempt(aw)
+        self._respond_attempt(aw)
+        return valid
 
-        self._set_velocity(self.th_veloc, self.th_accel, self.th_scv)
-        self._move([aw.move.pos["x"][0], aw.move.pos["y"][0], aw.move.pos["z"][0]], self.th_veloc)
-        self.toolhead.wait_moves()
-        self._set_velocity(aw.veloc, aw.accel, aw.scv)
-        timeMove = perf_counter()
+    def _init_search(self, aw: AttemptWrapper, m_var):
+        # Returns if the static value was provided, or should follow m_var
+        if aw.veloc == 0.0:
+            aw.veloc = 1.0
+        if aw.accel == 0.0:
+            aw.accel = 1.0
 
-        self._move([aw.move.pos["x"][1], aw.move.pos["y"][1], aw.move.pos["z"][1]], aw.veloc)
-        self.toolhead.wait_moves()
-        aw.move_time = perf_counter() - timeMove
+        if aw.type in ("accel", "graph"): # stat is velocity, var is accel
+            if aw.fixed is None:
+                aw.fixed = aw.veloc != 1.0
+            aw.move.Calc(self.axis_limits, aw.veloc, m_var, aw.margin)
+        elif aw.type in ("velocity"): # stat is accel, var is velocity
+            if aw.fixed is None:
+                aw.fixed = aw.accel != 1.0
+            aw.move.Calc(self.axis_limits, m_var, aw.accel, aw.margin)
+        elif aw.type in ("scv", "cruise"): # accel and velocity are both given
+            aw.fixed = True
+            aw.move.Calc(self.axis_limits, aw.veloc, aw.accel, aw.margin)
+        return aw.fixed
+
+    def _calc_attempt(self, aw: AttemptWrapper, m_var, fixed: bool):
+        from .funcs import calculate_accel, calculate_velocity
+        if aw.type in ("accel", "graph"):
+            if not fixed:
+                aw.veloc = calculate_velocity(m_var, aw.move.dist)/2.5
+            aw.accel = m_var
+        elif aw.type == "velocity":
+            if not fixed:
+                aw.accel = calculate_accel(m_var, aw.move.dist)*2.5
+            aw.veloc = m_var
+        elif aw.type == "scv":
+            aw.scv = m_var
+        elif aw.type == "cruise":
+            aw.cruise_ratio = m_var
+        aw.move.Calc(self.axis_limits, aw.veloc, aw.accel, aw.margin)
+
+    def _respond_attempt(self, aw: AttemptWrapper):
+        respond = f"AUTO SPEED {aw.type} on {aw.axis} try {aw.tries} ({aw.time_last:.2f}s)\n"
+        respond += f"Moved {aw.move_dist - aw.margin:.2f}mm at a{aw.accel:.0f}/v{aw.veloc:.0f}"
+        if aw.type == "scv":
+            respond += f"/scv{aw.scv:.0f}"
+        elif aw.type == "cruise":
+            respond += f"/cruise{aw.cruise_ratio:.2f}"
+        respond += f" after {aw.move_time_prehome:.2f}/{aw.move_time:.2f}/{aw.move_time_posthome:.2f}s (waited {aw.move_time_sync:.2f}s)\n"
+        if aw.motion:
+            respond += f"Peak v{aw.motion['peak_veloc']:.0f}/a{aw.motion['peak_accel']:.0f}, accel/cruise/decel {aw.motion['time_accel']:.2f}/{aw.motion['time_cruise']:.2f}/{aw.motion['time_decel']:.2f}s\n"
+        if aw.ladder_values:
+            respond += f"Ladder {', '.join(f'{value:.0f}' for value in aw.ladder_values)}\n"
+        respond += f"Missed"
+        for key, missed in aw.missed.items():
+            respond += f" {key.upper()} {missed:.2f},"
+        self.gcode.respond_info(respond[:-1])
+
+    def _attempt(self, aw: AttemptWrapper, values: list = None):
+        from .stats import read_motion
+        timeAttempt = perf_counter()
+
+        # Everything up to the post test home is queued without waiting,
+        #  moves keep the limits they were queued with
+        self.load.start()
+        aw.move_print_time = 0.0
+        aw.ladder_values = list(values) if values is not None and len(values) > 1 else []
+        strokes = []
+        for value in (values or [None]):
+            if value is not None:
+                self._calc_attempt(aw, value, aw.fixed)
+            start, end = self._stroke(aw)
+            strokes.append((start, end, aw.veloc, aw.accel))
+            aw.move_print_time += end - start
+        aw.move_time = aw.move_print_time
         aw.move_dist = aw.move.dist
+        # Move the queued strokes into the trapq history without waiting for them,
+        #  read them before a slow home lets the history expire
+        self.toolhead.flush_step_generation()
+        aw.motion = read_motion(self.printer, strokes) or {}
+        # Let the strokes run before the home, so homing isn't sampled as their load
+        wait = perf_counter()
+        self.toolhead.wait_moves()
+        wait = perf_counter() - wait
+        aw.load = self.load.stop()
+        aw.load["step_rate"] = self._step_rate(aw)
 
+        start_steps = aw.home_steps
         valid, aw.home_steps, aw.missed, aw.move_time_posthome = self._posttest(aw.home_steps, aw.max_missed, aw.move.home)
+        if values and aw.search_max is not None and values[-1] <= aw.search_max * BASELINE_FRACTION:
+            # Passed or not, so the allowance isn't narrowed to the homes that looked clean
+            self._refresh_baseline(start_steps, aw.home_steps, aw.move.home)
+        # The home would have waited for the strokes too, keep counting it there
+        aw.move_time_posthome += wait
+        aw.move_time_sync = wait + self.time_sync
         aw.time_last = perf_counter() - timeAttempt
+        self._log_attempt(aw, valid)
+
+        if valid and aw.motion.get("reached", None) is False and aw.type in ("accel", "velocity", "graph"):
+            # A pass that never ran at the tested speed doesn't prove it, try again with longer strokes
+            if aw.move.dist < aw.move.max_dist and aw.move.stretch < MAX_STRETCH:
+                ratio = aw.veloc / max(aw.motion["peak_veloc"], 1.0)
+                aw.move.stretch = min(MAX_STRETCH, aw.move.stretch * max(ratio**2, 1.1))
+                self.gcode.respond_info(f"AUTO SPEED {aw.type} on {aw.axis} only reached v{aw.motion['peak_veloc']:.0f}/a{aw.motion['peak_accel']:.0f}, lengthening moves to {aw.move.stretch:.2f}x")
+                if values is None:
+                    aw.move.Calc(self.axis_limits, aw.veloc, aw.accel, aw.margin)
+                return self._attempt(aw, values)
+            self.gcode.respond_info(f"AUTO SPEED warning: {aw.type} on {aw.axis} only reached v{aw.motion['peak_veloc']:.0f}/a{aw.motion['peak_accel']:.0f}, the axis is too short to test a{aw.accel:.0f}/v{aw.veloc:.0f}")
         return valid
 
+    def _stroke(self, aw: AttemptWrapper):
+        # Queue one test move, returns its planned start and end print time
+        path = aw.move.Path()
+        self._set_velocity(self.th_veloc, self.th_accel, self.th_scv)
+        self._move(path[0], self.th_veloc)
+        self._set_velocity(aw.veloc, aw.accel, aw.scv, aw.cruise_ratio)
+
+        printTime = self.toolhead.get_last_move_time()
+        for coord in path[1:]:
+            self._move(coord, aw.veloc)
+        return printTime, self.toolhead.get_last_move_time()
+
+    def _log_attempt(self, aw: AttemptWrapper, valid: bool):
+        if not self.attempt_log:
+            return
+        record = aw.record(valid)
+        record["time"] = f"{dt.datetime.now():%Y-%m-%d_%H:%M:%S}"
+        record["kinematics"] = self.printer_kinematics
+        os.makedirs(self.results_dir, exist_ok=True)
+        with open(self.attempt_log_path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+
     def _validate(self, speed, iterations, margin, small_margin, max_missed):
         pos = {
             "x": {
@@ -628,8 +1599,8 @@ class AutoSpeed:
                 "center_max": self.axis_limits["y"]["center"] + (small_margin/2),
             }
         }
-        self.toolhead.wait_moves()
         self._home(True, True, False)
+        self._sync()
         start_steps = self._get_steps()
         start = perf_counter()
         for _ in range(iterations):
@@ -664,49 +1635,93 @@ class AutoSpeed:
         duration = perf_counter() - start
 
         self._home(True, True, False)
+        self._sync()
         stop_steps = self._get_steps()
 
+        valid, missed = self._rail_missed(start_steps, stop_steps, ["x", "y"], max_missed)
+        return valid, duration, missed
+
+    def _validate_gcode(self, gcmd, path, accel, veloc, scv, margin, max_missed):
+        # Replay a window of a sliced file's XY moves, instead of Ellis' pattern
+        from .stream import window, bounds, fit
+        if not os.path.exists(path):
+            raise gcmd.error(f"No G-code file found at '{path}'")
+        start_move = gcmd.get_int('START', 0, minval=0)
+        moves      = gcmd.get_int('MOVES', 5000, minval=1)
+        scale      = gcmd.get_int('SCALE', 1, minval=0, maxval=1)
+        repeat     = gcmd.get_int('REPEAT', 1, minval=1)
+
+        area = (
+            self.axis_limits["x"]["min"] + margin, self.axis_limits["x"]["max"] - margin,
+            self.axis_limits["y"]["min"] + margin, self.axis_limits["y"]["max"] - margin,
+        )
+        # Two streaming passes, one to place the window and one to move
+        box, count = bounds(window(path, start_move, moves))
+        if count == 0:
+            raise gcmd.error(f"No XY moves in '{path}' after move {start_move}")
+        placed = fit(box, area, scale)
+        if placed is None:
+            raise gcmd.error(f"Moves {start_move}-{start_move + count} of '{path}' leave the VALIDATE_MARGIN area, use SCALE=1")
+        factor, dx, dy = placed
+
+        respond = f"AUTO SPEED validating {count} moves from {os.path.basename(path)}, {repeat} times\n"
+        respond += f"Acceleration: {accel:.0f}\n"
+        respond += f"Velocity: {veloc:.0f}\n"
+        respond += f"SCV: {scv:.0f}"
+        if factor < 1.0:
+            respond += f"\nScaled to {factor*100:.0f}% to fit inside VALIDATE_MARGIN"
+        self.gcode.respond_info(respond)
 
-        step_dif = {
-            "x": abs(start_steps["x"] - stop_steps["x"]),
-            "y": abs(start_steps["y"] - stop_steps["y"])
-        }
+        self._home(True, True, False)
+        self._sync()
+        start_steps = self._get_steps()
+        start = perf_counter()
+        self._set_velocity(veloc, accel, scv)
+        for _ in range(repeat):
+            for x, y in window(path, start_move, moves):
+                self._move([x * factor + dx, y * factor + dy, None], veloc)
+        self.toolhead.wait_moves()
+        duration = perf_counter() - start
+        self._set_velocity(self.th_veloc, self.th_accel, self.th_scv)
 
-        missed_x = step_dif['x']/self.steppers['x'][2]
-        missed_y = step_dif['y']/self.steppers['y'][2]
-        valid = True
-        if missed_x > max_missed:
-            valid = False
-        if missed_y > max_missed:
-            valid = False
-        return valid, duration, missed_x, missed_y
+        self._home(True, True, False)
+        self._sync()
+        stop_steps = self._get_steps()
+        valid, missed = self._rail_missed(start_steps, stop_steps, ["x", "y"], max_missed)
+
+        respond = f"AUTO SPEED validated G-code after {duration:.2f}s\n"
+        respond += f"Valid: {valid}\n"
+        respond += "Missed " + ", ".join(f"{key.upper()} {value:.2f}" for key, value in missed.items())
+        self.gcode.respond_info(respond)
+        return valid
 
     def _endstop_variance(self, samples: int, x=True, y=True):
         variance = {
             "x": [],
             "y": [],
-            "steps": {
-                "x": None,
-                "y": None
-            }
+            "jitter": {
+                "x": [],
+                "y": []
+            },
+            "steps": None
         }
         for _ in range(0, samples):
-            self.toolhead.wait_moves()
             self._home(x, y, False)
+            self._sync()
             steps = self._get_steps()
 
-            if x:
-                if variance["steps"]["x"] is not None:
-                    x_dif = abs(variance["steps"]["x"] - steps["x"])
-                    missed_x = x_dif/self.steppers['x'][2]
+            if variance["steps"] is not None:
+                if x:
+                    missed_x, jitter_x = self._missed("x", variance["steps"], steps)
                     variance["x"].append(missed_x)
-                variance["steps"]["x"] = steps["x"]
-            if y:
-                if variance["steps"]["y"] is not None:
-                    y_dif = abs(variance["steps"]["y"] - steps["y"])
-                    missed_y = y_dif/self.steppers['y'][2]
+                    if jitter_x is not None:
+                        variance["jitter"]["x"].append(jitter_x)
+                if y:
+                    missed_y, jitter_y = self._missed("y", variance["steps"], steps)
                     variance["y"].append(missed_y)
-                variance["steps"]["y"] = steps["y"]
+                    if jitter_y is not None:
+                        variance["jitter"]["y"].append(jitter_y)
+            variance["steps"] = steps
         return variance
 
     def _move(self, coord, speed):
@@ -716,6 +1731,7 @@ class AutoSpeed:
         prevAccel = self.toolhead.max_accel
         prevVeloc = self.toolhead.max_velocity
         prevScv   = self.toolhead.square_corner_velocity
+        prevRatio = self._get_cruise_ratio()
         self._set_velocity(self.th_veloc, self.th_accel, self.th_scv)
         command = ["G28"]
         if x:
@@ -725,8 +1741,13 @@ class AutoSpeed:
         if z:
             command[-1] += " Z0"
         self.gcode._process_commands(command, False)
+        self._set_velocity(prevVeloc, prevAccel, prevScv, prevRatio)
+
+    def _sync(self):
+        # Wait for the toolhead right before counting steps
+        start = perf_counter()
         self.toolhead.wait_moves()
-        self._set_velocity(prevVeloc, prevAccel, prevScv)
+        self.time_sync = perf_counter() - start
 
     def _get_steps(self):
         kin = self.toolhead.get_kinematics()
@@ -734,61 +1755,102 @@ class AutoSpeed:
         pos = {}
         for s in steppers:
             s_name = s.get_name()
-            if s_name in ["stepper_x", "stepper_y", "stepper_z"]:
-                pos[s_name[-1]] = s.get_mcu_position()
+            if s_name[len("stepper_"):] in self.rail_steppers:
+                pos[s_name[len("stepper_"):]] = s.get_mcu_position()
         return pos
 
+    def _missed(self, axis, start_steps, stop_steps):
+        # Returns (missed, jitter) full steps, jitter is None without phase rounding
+        #  axis is any tracked stepper, like z or z1
+        microsteps = self.rail_steppers[axis]["microsteps"]
+        step_dif = abs(start_steps[axis] - stop_steps[axis])
+        if not self.phase:
+            return step_dif/microsteps, None
+        from .phase import refine
+        return refine(step_dif, microsteps)
+
     def _prehome(self, home: list):
-        self.toolhead.wait_moves()
         dur = perf_counter()
         self._home(home[0], home[1], home[2])
-        self.toolhead.wait_moves()
+        self._sync()
         dur = perf_counter() - dur
 
         home_steps = self._get_steps()
         return home_steps, dur
 
     def _posttest(self, start_steps, max_missed, home: list):
-        self.toolhead.wait_moves()
+        # Homing waits for the queued test move, so this includes the move itself
         dur = perf_counter()
         self._home(home[0], home[1], home[2])
-        self.toolhead.wait_moves()
+        self._sync()
         dur = perf_counter() - dur
 
-        valid = True
         stop_steps = self._get_steps()
-        step_dif = {}
-        missed = {}
-        if home[0]:
-            step_dif["x"] = abs(start_steps["x"] - stop_steps["x"])
-            missed["x"] = step_dif['x']/self.steppers['x'][2]
-            if missed["x"] > max_missed:
-                valid = False
-        if home[1]:
-            step_dif["y"] = abs(start_steps["y"] - stop_steps["y"])
-            missed["y"] = step_dif['y']/self.steppers['y'][2]
-            if missed["y"] > max_missed:
-                valid = False
-        if home[2]:
-            step_dif["z"] = abs(start_steps["z"] - stop_steps["z"])
-            missed["z"] = step_dif['z']/self.steppers['z'][2]
-            if missed["z"] > max_missed:
-                valid = False
+        homed = [axis for axis, h in zip(("x", "y", "z"), home) if h]
+        valid, missed = self._rail_missed(start_steps, stop_steps, homed, max_missed)
+
+        if home[2] and self._relevel(valid, missed, max_missed):
+            stop_steps = self._get_steps()
 
         return valid, stop_steps, missed, dur
 
-    def _set_velocity(self, velocity: float, accel: float, scv: float):
+    def _rail_missed(self, start_steps, stop_steps, axes: list, max_missed: float):
+        # Returns (valid, {stepper: missed}) for every stepper on the axes' rails,
+        #  one losing steps fails the whole check
+        valid = True
+        missed = {}
+        for key, stepper in self.rail_steppers.items():
+            if stepper["axis"] not in axes or key not in start_steps:
+                continue
+            missed[key], _ = self._missed(key, start_steps, stop_steps)
+            if missed[key] > max_missed + self._allowance(stepper["axis"]):
+                valid = False
+        return valid, missed
+
+    def _relevel(self, valid: bool, missed: dict, max_missed: float):
+        # Level again only when a Z attempt may have twisted the gantry
+        #  Returns True if the gantry was leveled and homed again
+        if not self.leveled:
+            return False
+        in_plane = valid
+        if self.z_endstops:
+            # Each Z stepper stopped on its own endstop, compare them
+            z_missed = [value for key, value in missed.items() if self.rail_steppers[key]["axis"] == "z"]
+            in_plane = in_plane and max(z_missed) - min(z_missed) <= max_missed
+        # Otherwise they all count the same steps, only a failed attempt shows the gantry may have twisted
+        if in_plane:
+            return False
+        lookup, name = self._level_method()
+        lm = self.printer.lookup_object(lookup)
+        self.gcode.respond_info(f"AUTO SPEED Z steppers out of plane, leveling with {name}...")
+        self.gcode._process_commands([name], False)
+        if lm.z_status.applied is False:
+            self.leveled = False
+            self.gcode.respond_info(f"AUTO SPEED warning: failed to level printer, Z steppers may be out of plane")
+            return False
+        self._home(False, False, True)
+        self._sync()
+        return True
+
+    def _set_velocity(self, velocity: float, accel: float, scv: float, cruise_ratio: float = 0.0):
         #self.gcode.respond_info(f"AUTO SPEED setting limits to VELOCITY={velocity} ACCEL={accel}")
         self.toolhead.max_velocity = velocity
         self.toolhead.max_accel = accel
-        self.toolhead.requested_accel_to_decel = accel
+        if hasattr(self.toolhead, "min_cruise_ratio"): # Replaced accel_to_decel in newer klipper
+            self.toolhead.min_cruise_ratio = cruise_ratio
+        else:
+            self.toolhead.requested_accel_to_decel = accel * (1 - cruise_ratio)
         self.toolhead.square_corner_velocity = scv
         self.toolhead._calc_junction_deviation()
 
+    def _get_cruise_ratio(self):
+        if hasattr(self.toolhead, "min_cruise_ratio"):
+            return self.toolhead.min_cruise_ratio
+        return 1 - min(self.toolhead.requested_accel_to_decel / self.toolhead.max_accel, 1.0)
+
     def cmd_X_ENDSTOP_ACCURACY(self, gcmd):
 
-        if not len(self.steppers.keys()) == 3:
-            raise gcmd.error(f"Printer must be homed first! Found {len(self.steppers.keys())} homed axes.")
+        self._check_homed(gcmd)
 
         # Number of samples for accuracy check
         sample_count = gcmd.get_int("SAMPLES", 10, minval=1)
@@ -840,8 +1902,7 @@ class AutoSpeed:
 
     def cmd_Y_ENDSTOP_ACCURACY(self, gcmd):
 
-        if not len(self.steppers.keys()) == 3:
-            raise gcmd.error(f"Printer must be homed first! Found {len(self.steppers.keys())} homed axes.")
+        self._check_homed(gcmd)
 
         # Number of samples for accuracy check
         sample_count = gcmd.get_int("SAMPLES", 10, minval=1)
@@ -892,8 +1953,7 @@ class AutoSpeed:
 
     def cmd_Z_ENDSTOP_ACCURACY(self, gcmd):
 
-        if not len(self.steppers.keys()) == 3:
-            raise gcmd.error(f"Printer must be homed first! Found {len(self.steppers.keys())} homed axes.")
+        self._check_homed(gcmd)
 
         # Number of samples for accuracy check
         sample_count = gcmd.get_int("SAMPLES", 10, minval=1)
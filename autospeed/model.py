@@ -0,0 +1,76 @@
+# Find your printers max speed before losing steps
+#
+# Copyright (C) 2024 Anonoei <dev@anonoei.com>
+#
+# This file may be distributed under the terms of the MIT license.
+
+import numpy as np # this may fail if numpy isn't installed
+
+class TorqueModel:
+    """Stepper torque-vs-speed curve, as max acceleration at a velocity
+
+    a(v) = a0 / (1 + v/vc), which is linear in 1/a:
+    1/a = p0 + p1*v, with a0 = 1/p0 and vc = p0/p1
+    """
+    def __init__(self, accuracy: float):
+        # Relative accuracy of a single measurement (binary search accuracy)
+        self.accuracy = accuracy
+        self.velocs = []
+        self.accels = []
+        self.p = None
+        self.cov = None
+
+    def __str__(self):
+        if self.p is None:
+            return "TorqueModel unfitted"
+        return f"TorqueModel a0 {self.a0:.0f}, vc {self.vc:.0f} from {len(self.velocs)} samples"
+
+    @property
+    def a0(self):
+        return 1 / self.p[0]
+
+    @property
+    def vc(self):
+        if self.p[1] <= 0:
+            return float("inf")
+        return self.p[0] / self.p[1]
+
+    def add(self, veloc: float, accel: float):
+        self.velocs.append(float(veloc))
+        self.accels.append(float(accel))
+        if len(self.velocs) >= 2:
+            self.fit()
+
+    def fit(self):
+        v = np.array(self.velocs)
+        y = 1 / np.array(self.accels)
+        A = np.vstack([np.ones_like(v), v]).T
+        self.p, res, rank, _ = np.linalg.lstsq(A, y, rcond=None)
+
+        # Measurement noise floor, each sample is only known to +-accuracy/2
+        var = (self.accuracy/2 * np.mean(y))**2
+        if len(v) > 2:
+            resid = y - A @ self.p
+            var = max(var, float(resid @ resid) / (len(v) - 2))
+        if rank < 2: # All samples at one velocity, slope is unknown
+            self.cov = np.diag([var, (np.mean(y) / max(np.max(v), 1.0))**2])
+        else:
+            self.cov = var * np.linalg.inv(A.T @ A)
+
+    def predict(self, veloc):
+        x = np.array([1.0, float(veloc)])
+        inv = float(x @ self.p)
+        inv_std = float(np.sqrt(x @ self.cov @ x))
+        inv = max(inv, 1e-9)
+        accel = 1 / inv
+        return accel, accel * (inv_std / inv) # Delta method, relative stds match
+
+    def uncertainty(self, veloc):
+        accel, std = self.predict(veloc)
+        return 2 * std / accel # ~95% relative band
+
+    def next_velocity(self, candidates):
+        return max(candidates, key=self.uncertainty)
+
+    def converged(self, candidates, tolerance: float):
+        return max(self.uncertainty(v) for v in candidates) <= tolerance
@@ -0,0 +1,163 @@
+# Find your printers max speed before losing steps
+#
+# Copyright (C) 2024 Anonoei <dev@anonoei.com>
+#
+# This file may be distributed under the terms of the MIT license.
+
+import os
+import csv
+import datetime as dt
+from collections import deque
+
+FIELDS = ["time", "print", "accel", "velocity", "scv", "missed_x", "missed_y", "missed_z"]
+
+class PrintMonitor:
+    """Missed steps between the homes a print already does
+
+    The first home of each axis in a print is its reference, every later home in the same
+    print (like an end-print macro's) replaces that print's measurement.
+    Nothing runs outside of homing.
+    """
+    def __init__(self, autospeed, path: str, window: int, alert: float):
+        self.autospeed = autospeed
+        self.printer = autospeed.printer
+        self.path = path
+        self.alert = alert
+        self.records = deque(maxlen=window)
+        self.print_id = None
+        self.print_file = None
+        self.start_steps = None
+        self.start_axes = []
+        self.start_limits = {}
+        self.last_duration = 0.0
+        self.alerted = None
+        self.print_stats = None
+        self._load()
+
+    def _load(self):
+        # Rolling statistics survive restarts
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r") as f:
+            for row in csv.DictReader(f):
+                record = dict(row)
+                for key in FIELDS[2:]:
+                    record[key] = float(record[key]) if record[key] not in ("", None) else None
+                if self.records and self.records[-1]["print"] == record["print"]:
+                    self.records[-1] = record
+                else:
+                    self.records.append(record)
+
+    def _status(self):
+        if self.print_stats is None:
+            self.print_stats = self.printer.lookup_object("print_stats", None)
+            if self.print_stats is None:
+                return None
+        return self.print_stats.get_status(self.printer.get_reactor().monotonic())
+
+    def home(self, axes: list):
+        status = self._status()
+        if status is None or status["state"] != "printing":
+            return
+        # A new print starts over, its duration resets
+        if self.print_id is None or status["print_duration"] < self.last_duration or status["filename"] != self.print_file:
+            self.print_id = f"{dt.datetime.now():%Y-%m-%d_%H:%M:%S} {status['filename']}"
+            self.print_file = status["filename"]
+            self.start_steps = self.autospeed._get_steps()
+            self.start_axes = list(axes)
+            toolhead = self.autospeed.toolhead
+            self.start_limits = {
+                "accel": toolhead.max_accel,
+                "velocity": toolhead.max_velocity,
+                "scv": toolhead.square_corner_velocity,
+            }
+            self.last_duration = status["print_duration"]
+            return
+        self.last_duration = status["print_duration"]
+        steps = self.autospeed._get_steps()
+        record = {
+            "time": f"{dt.datetime.now():%Y-%m-%d_%H:%M:%S}",
+            "print": self.print_id,
+            **self.start_limits,
+        }
+        for axis in ("x", "y", "z"):
+            record[f"missed_{axis}"] = None
+            if axis not in axes:
+                continue
+            if axis in self.start_axes:
+                record[f"missed_{axis}"], _ = self.autospeed._missed(axis, self.start_steps, steps)
+            else:
+                # First home of this axis in the print, like a start macro's G28 Z after G28 X Y
+                self.start_steps[axis] = steps[axis]
+                self.start_axes.append(axis)
+        if all(record[f"missed_{axis}"] is None for axis in ("x", "y", "z")):
+            return
+        if self.records and self.records[-1]["print"] == self.print_id:
+            self.records[-1] = record
+        else:
+            self.records.append(record)
+        self._log(record)
+        self._check()
+
+    def _log(self, record: dict):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        new = not os.path.exists(self.path)
+        with open(self.path, "a", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=FIELDS)
+            if new:
+                writer.writeheader()
+            writer.writerow(record)
+
+    def stats(self):
+        # Returns {axis: (mean, max, older mean, recent mean)} over the window
+        stats = {}
+        for axis in ("x", "y", "z"):
+            missed = [r[f"missed_{axis}"] for r in self.records if r[f"missed_{axis}"] is not None]
+            if not missed:
+                continue
+            half = len(missed) // 2
+            older = missed[:half] or missed
+            recent = missed[half:]
+            stats[axis] = (
+                sum(missed) / len(missed),
+                max(missed),
+                sum(older) / len(older),
+                sum(recent) / len(recent),
+            )
+        return stats
+
+    def trending(self):
+        # Axes losing more steps recently than the alert level, and more than before
+        return [
+            axis for axis, (_, _, older, recent) in self.stats().items()
+            if recent > self.alert and recent > older
+        ]
+
+    def suggestion(self):
+        # Derate the accel prints used by how far the losses are past the alert level
+        if not self.records:
+            return None
+        record = self.records[-1]
+        worst = max(recent for _, _, _, recent in self.stats().values())
+        derate = max(0.5, 1 - 0.05 * worst / self.alert)
+        return record["accel"] * derate
+
+    def _check(self):
+        trending = self.trending()
+        if not trending:
+            self.alerted = None
+            return
+        if self.alerted == trending:
+            return
+        self.alerted = trending
+        axes = ", ".join(axis.upper() for axis in trending)
+        self.autospeed.gcode.respond_info(
+            f"AUTO SPEED monitor: missed steps are trending up on {axes}, "
+            f"consider lowering acceleration to {self.suggestion():.0f} or running AUTO_SPEED_CHECK"
+        )
+
+    def reset(self):
+        self.records.clear()
+        self.alerted = None
+        if os.path.exists(self.path):
+            os.remove(self.path)
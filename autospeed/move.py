@@ -12,6 +12,7 @@ class Move:
     home = [False, False, False]
     def __init__(self):
         self.dist = 0.0
+        self.stretch = 1.0 # Lengthens moves that didn't reach their velocity
         self.pos = {}
         self.max_dist: float = 0.0
 
@@ -30,12 +31,41 @@ class Move:
             self.Init(axis_limits, margin)
 
     def _validate(self, margin: float):
+        self.dist *= self.stretch
         if self.dist < 5.0:
             self.dist = 5.0
         self.dist += margin
         if self.dist > self.max_dist:
             self.dist = self.max_dist
 
+    def _place(self, limits, margin):
+        # End the stroke on the side of the axis its endstop is on,
+        #  so homing after the move is as short as possible
+        if limits["home"] <= limits["center"]:
+            return [limits["min"] + self.dist, limits["min"] + margin]
+        return [limits["max"] - self.dist, limits["max"] - margin]
+
+    def _place_diag(self, axis_limits, margin, corners):
+        # Choose whichever corner the diagonal can end in that's closest to home
+        def end(limits, side):
+            if side == "min":
+                return [limits["min"] + self.dist, limits["min"] + margin]
+            return [limits["max"] - self.dist, limits["max"] - margin]
+        def home_dist(corner):
+            return sum(
+                abs(end(axis_limits[axis], side)[1] - axis_limits[axis]["home"])
+                for axis, side in zip(("x", "y"), corner)
+            )
+        x_side, y_side = min(corners, key=home_dist)
+        return end(axis_limits["x"], x_side), end(axis_limits["y"], y_side)
+
+    def Path(self):
+        # Pre-position, then every point of the test move
+        return [
+            [self.pos["x"][0], self.pos["y"][0], self.pos["z"][0]],
+            [self.pos["x"][1], self.pos["y"][1], self.pos["z"][1]],
+        ]
+
     def Init(self, axis_limits, margin):
         ...
     def Calc(self, axis_limits, veloc, accel, margin):
@@ -51,10 +81,7 @@ class MoveX(Move):
         self.dist = calculate_distance(veloc, accel)/2
         self._validate(margin)
         self.pos = {
-            "x": [
-                axis_limits["x"]["max"] - self.dist,
-                axis_limits["x"]["max"] - margin
-            ],
+            "x": self._place(axis_limits["x"], margin),
             "y": [None, None],
             "z": [None, None]
         }
@@ -70,10 +97,7 @@ class MoveY(Move):
         self._validate(margin)
         self.pos = {
             "x": [None, None],
-            "y": [
-                axis_limits["y"]["max"] - self.dist,
-                axis_limits["y"]["max"] - margin
-            ],
+            "y": self._place(axis_limits["y"], margin),
             "z": [None, None]
         }
 
@@ -85,15 +109,11 @@ class MoveDiagX(Move):
         self._calc(axis_limits, veloc, accel, margin)
         self.dist = (calculate_distance(veloc, accel)/2 * math.sin(45))
         self._validate(margin)
+        # Moving along +x+y, ending at max/max or min/min
+        pos_x, pos_y = self._place_diag(axis_limits, margin, [("max", "max"), ("min", "min")])
         self.pos = {
-            "x": [
-                axis_limits["x"]["max"] - self.dist,
-                axis_limits["x"]["max"] - margin
-            ],
-            "y": [
-                axis_limits["y"]["max"] - self.dist,
-                axis_limits["y"]["max"] - margin
-            ],
+            "x": pos_x,
+            "y": pos_y,
             "z": [None, None]
         }
 
@@ -105,15 +125,11 @@ class MoveDiagY(Move):
         self._calc(axis_limits, veloc, accel, margin)
         self.dist = (calculate_distance(veloc, accel)/2 * math.sin(45))
         self._validate(margin)
+        # Moving along -x+y, ending at min/max or max/min
+        pos_x, pos_y = self._place_diag(axis_limits, margin, [("min", "max"), ("max", "min")])
         self.pos = {
-            "x": [
-                axis_limits["x"]["min"] + self.dist,
-                axis_limits["x"]["min"] + margin
-            ],
-            "y": [
-                axis_limits["y"]["max"] - self.dist,
-                axis_limits["y"]["max"] - margin
-            ],
+            "x": pos_x,
+            "y": pos_y,
             "z": [None, None]
         }
 
@@ -127,14 +143,104 @@ class MoveZ(Move):
         self.pos = {
             "x": [None, None],
             "y": [None, None],
+            "z": self._place(axis_limits["z"], margin)
         }
-        if axis_limits["z"]["home"] <= axis_limits["z"]["min"]:
-            self.pos["z"] =  [
-                axis_limits["z"]["min"] + self.dist,
-                axis_limits["z"]["min"] + margin
-            ]
-        else:
-            self.pos["z"] =  [
-                axis_limits["z"]["max"] - self.dist,
-                axis_limits["z"]["max"] - margin
-            ]
\ No newline at end of file
+
+class MoveSCV(Move):
+    """Zig-zag staircase of 90 degree corners, to load square_corner_velocity"""
+    home = [True, True, False]
+    iterations = 5
+    def Init(self, axis_limits, margin, _):
+        self.max_dist = min(axis_limits["x"]["dist"], axis_limits["y"]["dist"]) - margin*2
+    def _segment(self, veloc, accel):
+        # Each segment is long enough to reach veloc before the next corner
+        return calculate_distance(veloc, accel)
+
+    def Calc(self, axis_limits, veloc, accel, margin):
+        self.dist = self._segment(veloc, accel)
+        self._validate(margin)
+        segment = self.dist - margin
+        steps = max(1, int(self.max_dist // segment))
+        box = segment * steps
+        self.pos = {}
+        for axis in ("x", "y"):
+            limits = axis_limits[axis]
+            if limits["home"] <= limits["center"]: # Finish the pattern by the endstops
+                self.pos[axis] = [limits["min"] + margin + box, limits["min"] + margin]
+            else:
+                self.pos[axis] = [limits["max"] - margin - box, limits["max"] - margin]
+        self.pos["z"] = [None, None]
+        self.steps = steps
+
+    def Path(self):
+        start = [self.pos["x"][0], self.pos["y"][0]]
+        end = [self.pos["x"][1], self.pos["y"][1]]
+        step_x = (end[0] - start[0]) / self.steps
+        step_y = (end[1] - start[1]) / self.steps
+        there = []
+        x, y = start
+        for _ in range(self.steps):
+            x += step_x
+            there.append([x, y, None])
+            y += step_y
+            there.append([x, y, None])
+        back = [[p[0], p[1], None] for p in reversed(there[:-1])] + [[start[0], start[1], None]]
+        path = [[start[0], start[1], None]]
+        for i in range(self.iterations):
+            path += there
+            if i < self.iterations - 1:
+                path += back
+        return path
+
+class MoveCruise(MoveSCV):
+    """Zig-zag of short fixed segments, like infill, to load accel_to_decel"""
+    segment = 10.0
+    def _segment(self, veloc, accel):
+        return self.segment
+
+class MoveStepper(Move):
+    """Straight stroke along the toolhead direction that moves one stepper the most"""
+    def __init__(self, direction: list):
+        super().__init__()
+        self.direction = direction
+
+    def _room(self, axis_limits, margin, sign):
+        # How far the stroke can go from the center before leaving the margins
+        room = math.inf
+        for axis, u in zip(("x", "y", "z"), self.direction):
+            u *= sign
+            if abs(u) < 1e-9:
+                continue
+            limits = axis_limits[axis]
+            edge = limits["max"] - margin if u > 0 else limits["min"] + margin
+            room = min(room, (edge - limits["center"]) / u)
+        return max(room, 0.0)
+
+    def Init(self, axis_limits, margin, isolate_xy):
+        moves = [abs(u) > 1e-9 for u in self.direction]
+        self.home = [
+            moves[0] or (moves[1] and not isolate_xy),
+            moves[1] or (moves[0] and not isolate_xy),
+            moves[2],
+        ]
+        # End the stroke toward the endstops
+        toward = sum(
+            u * (axis_limits[axis]["home"] - axis_limits[axis]["center"])
+            for axis, u in zip(("x", "y", "z"), self.direction)
+        )
+        self.sign = 1.0 if toward >= 0 else -1.0
+        self.room_end = self._room(axis_limits, margin, self.sign)
+        self.max_dist = self.room_end + self._room(axis_limits, margin, -self.sign) + margin
+
+    def Calc(self, axis_limits, veloc, accel, margin):
+        self._calc(axis_limits, veloc, accel, margin)
+        self.dist = calculate_distance(veloc, accel)/2
+        self._validate(margin)
+        stroke = self.dist - margin
+        self.pos = {}
+        for axis, u in zip(("x", "y", "z"), self.direction):
+            if abs(u) < 1e-9:
+                self.pos[axis] = [None, None]
+                continue
+            end = axis_limits[axis]["center"] + self.sign * u * self.room_end
+            self.pos[axis] = [end - self.sign * u * stroke, end]
@@ -0,0 +1,18 @@
+# Find your printers max speed before losing steps
+#
+# Copyright (C) 2024 Anonoei <dev@anonoei.com>
+#
+# This file may be distributed under the terms of the MIT license.
+
+# A stalled motor slips whole electrical cycles, the rotor locks back onto the
+#  same phase. Each cycle is 4 full steps.
+#  This is plain rounding of the MCU step difference, the driver's microstep
+#  counter follows the commanded steps so it can't see missed steps itself.
+FULL_STEPS_PER_CYCLE = 4
+
+def refine(step_dif: int, microsteps: int):
+    # Returns (missed, jitter) in full steps, missed is whole electrical cycles
+    #  Quantized to 4 full steps: 2.1 steps of endstop jitter counts as 4 missed, a 1.9 step loss as 0
+    cycle = FULL_STEPS_PER_CYCLE * microsteps
+    cycles = round(step_dif / cycle)
+    return cycles * FULL_STEPS_PER_CYCLE, abs(step_dif - cycles * cycle) / microsteps
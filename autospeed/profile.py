@@ -0,0 +1,44 @@
+# Find your printers max speed before losing steps
+#
+# Copyright (C) 2024 Anonoei <dev@anonoei.com>
+#
+# This file may be distributed under the terms of the MIT license.
+
+import datetime as dt
+
+def build_profile(velocs: list, accels: dict, derate: float):
+    """Build a velocity -> safe accel table from per axis graph results
+
+    Every axis shares the same velocities. The slowest axis wins, and accel
+    never rises with velocity, so a row is safe for any speed up to its velocity.
+    """
+    table = []
+    safe = None
+    for i, veloc in enumerate(velocs):
+        accel = min(axis_accels[i] for axis_accels in accels.values()) * derate
+        if safe is None or accel < safe:
+            safe = accel
+        table.append((veloc, round(safe)))
+    return table
+
+def write_profile(path: str, table: list, axes: list):
+    rows = ", ".join(f"[{veloc:.0f}, {accel:.0f}]" for veloc, accel in table)
+    with open(path, "w") as f:
+        f.write(f"# Generated by AUTO_SPEED_GRAPH on {dt.datetime.now():%Y-%m-%d %H:%M:%S}\n")
+        f.write(f"# Axes: {', '.join(axes)}\n")
+        f.write("# Rows are [velocity, accel], accel is safe for any speed up to velocity\n")
+        f.write("[gcode_macro AUTO_SPEED_PROFILE]\n")
+        f.write("description: Set acceleration for a feature's speed from the AUTO_SPEED_GRAPH profile\n")
+        f.write(f"variable_profile: [{rows}]\n")
+        f.write(f"variable_max_velocity: {table[-1][0]:.0f}\n")
+        f.write("gcode:\n")
+        f.write("    {% set speed = params.VELOCITY|default(printer.toolhead.max_velocity)|float %}\n")
+        f.write("    {% set ns = namespace(veloc=profile[-1][0], accel=profile[-1][1]) %}\n")
+        f.write("    {% for veloc, accel in profile|reverse %}\n")
+        f.write("        {% if veloc >= speed %}\n")
+        f.write("            {% set ns.veloc = veloc %}\n")
+        f.write("            {% set ns.accel = accel %}\n")
+        f.write("        {% endif %}\n")
+        f.write("    {% endfor %}\n")
+        # Faster features than the profile was measured at still get its fastest row
+        f.write("    SET_VELOCITY_LIMIT VELOCITY={[ns.veloc, max_velocity]|min} ACCEL={ns.accel}\n")
@@ -0,0 +1,345 @@
+# Find your printers max speed before losing steps
+#
+# Copyright (C) 2024 Anonoei <dev@anonoei.com>
+#
+# This file may be distributed under the terms of the MIT license.
+
+import json
+import math
+import random
+from functools import partial
+
+# -------------------------------------------------------
+#
+#     Attempt log
+#
+# -------------------------------------------------------
+def load_attempts(path: str):
+    attempts = []
+    with open(path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            attempts.append(json.loads(line))
+    return attempts
+
+def attempt_value(attempt: dict):
+    # The value a search was varying for this attempt
+    if attempt["type"] == "velocity":
+        return attempt["veloc"]
+    if attempt["type"] == "scv":
+        return attempt["scv"]
+    if attempt["type"] == "cruise":
+        return attempt["cruise_ratio"]
+    return attempt["accel"]
+
+def group_attempts(attempts: list):
+    """Group attempts by the search they were part of
+
+    Single attempts outside a search (AUTO_SPEED_CHECK, AUTO_SPEED_SOAK,
+    AUTO_SPEED_CRUISE) are left out. Cruise fails at low ratios instead of high
+    values, so the model couldn't fit it anyways. Logs from before runs were
+    recorded are grouped by the same fixed parameters instead.
+    """
+    groups = {}
+    for attempt in attempts:
+        if attempt["type"] == "cruise":
+            continue
+        if "run" in attempt and attempt["run"] is None:
+            continue
+        key = f"{attempt['axis']} {attempt['type']}"
+        if attempt["type"] in ("graph", "scv") or (attempt["type"] == "accel" and attempt.get("fixed")):
+            key += f" v{attempt['veloc']:.0f}"
+        if attempt["type"] in ("scv",) or (attempt["type"] == "velocity" and attempt.get("fixed")):
+            key += f" a{attempt['accel']:.0f}"
+        key += f" max_missed {attempt['max_missed']}"
+        if attempt.get("run"):
+            key += f" @{attempt['run']}"
+        groups.setdefault(key, []).append(attempt)
+    return groups
+
+# -------------------------------------------------------
+#
+#     Pass/fail model
+#
+# -------------------------------------------------------
+class AxisModel:
+    """Logistic pass/fail model of one axis, P(fail) rises around `limit`"""
+    def __init__(self, samples: list):
+        # samples is a list of (value, valid)
+        self.samples = sorted(samples)
+        self.limit: float = None
+        self.width: float = None
+        self.lo = self.samples[0][0]
+        self.hi = self.samples[-1][0]
+        self._fit()
+
+    def __str__(self):
+        return f"AxisModel limit {self.limit:.0f}, width {self.width:.0f} from {len(self.samples)} samples"
+
+    def p_fail(self, value: float):
+        z = (value - self.limit) / self.width
+        if z > 50:
+            return 1.0
+        if z < -50:
+            return 0.0
+        return 1 / (1 + math.exp(-z))
+
+    def _nll(self, limit, width):
+        nll = 0.0
+        self.limit, self.width = limit, width
+        for value, valid in self.samples:
+            p = min(max(self.p_fail(value), 1e-6), 1 - 1e-6)
+            nll -= math.log(1 - p) if valid else math.log(p)
+        return nll
+
+    def _fit(self):
+        passed = [v for v, valid in self.samples if valid]
+        failed = [v for v, valid in self.samples if not valid]
+        if not failed: # Never failed, limit is past the highest sample
+            self.limit, self.width = self.hi * 1.1, max(self.hi * 0.01, 1.0)
+            return
+        if not passed: # Never passed, limit is below the lowest sample
+            self.limit, self.width = self.lo * 0.9, max(self.lo * 0.01, 1.0)
+            return
+        # Grid search the maximum likelihood limit/width,
+        #  samples are few and this avoids needing numpy
+        lo = min(failed)
+        hi = max(passed)
+        if lo > hi:
+            lo, hi = hi, lo
+        span = max(hi - lo, self.hi * 0.005, 1.0)
+        best = None
+        for i in range(0, 41):
+            limit = lo - span + (3 * span) * i / 40
+            for width in (span/40, span/20, span/10, span/5, span/2, span):
+                nll = self._nll(limit, width)
+                if best is None or nll < best[0]:
+                    best = (nll, limit, width)
+        self.limit, self.width = best[1], best[2]
+
+    def oracle(self, rng: random.Random):
+        def attempt(value):
+            return rng.random() >= self.p_fail(value)
+        return attempt
+
+def build_models(attempts: list, max_missed: float = None):
+    models = {}
+    for key, group in group_attempts(attempts).items():
+        samples = []
+        for attempt in group:
+            valid = attempt["valid"]
+            if max_missed is not None and attempt["missed"]:
+                valid = max(attempt["missed"].values()) <= max_missed
+            samples.append((attempt_value(attempt), valid))
+        models[key] = AxisModel(samples)
+    return models
+
+def attempt_times(attempts: list):
+    # Mean seconds per home and per test move from the recorded attempts
+    #  The post test home waits for the queued test move, take the planned move time back out
+    homes = []
+    moves = []
+    for a in attempts:
+        move = a.get("time_move_print", None)
+        if a["time_posthome"]:
+            homes.append(max(a["time_posthome"] - (move or 0.0), 0.0))
+        if move is None and a["time_last"]: # Logged before attempts were queued
+            move = a["time_last"] - a["time_posthome"]
+        if move:
+            moves.append(move)
+    home = sum(homes)/len(homes) if homes else 0.0
+    move = sum(moves)/len(moves) if moves else 0.0
+    return home, move
+
+# -------------------------------------------------------
+#
+#     Search strategies
+#
+#  Each returns (result, attempts, homes)
+#
+# -------------------------------------------------------
+def _ladder(m_var, m_max, accuracy, ladder):
+    # Mirrors AutoSpeed._ladder
+    values = [m_var]
+    while len(values) < ladder:
+        value = (values[-1] + m_max)//2
+        if value <= values[-1] * (1 + accuracy):
+            break
+        values.append(value)
+    return values
+
+def search_binary(oracle, m_min, m_max, accuracy, ladder=1):
+    # Mirrors AutoSpeed.binary_search, tries counts every test move of a ladder
+    m_var = m_min + (m_max-m_min) // 3
+    measured_val = None
+    tries = 0
+    homes = 1
+    laddering = ladder > 1
+    laddered = False
+    measuring = True
+    while measuring:
+        values = _ladder(m_var, m_max, accuracy, ladder) if laddering else [m_var]
+        homes += 1
+        tries += len(values)
+        valid = all([oracle(value) for value in values]) # Every rung runs before the home
+        if len(values) > 1 and not valid:
+            m_max = values[-1]
+            laddering = False
+            laddered = True
+            continue
+        m_var = values[-1]
+        if measured_val is not None:
+            if m_var * (1 + accuracy) > m_max or m_var * (1 - accuracy) < m_min:
+                measuring = False
+        measured_val = m_var
+        if valid:
+            m_min = m_var
+            laddering = ladder > 1 and not laddered
+        else:
+            m_max = m_var
+        m_var = (m_min + m_max)//2
+    return m_var, tries, homes
+
+def search_gallop(oracle, m_min, m_max, accuracy):
+    # Double from the minimum until failing, then bisect the last step
+    tries = 0
+    m_var = m_min * 2
+    while m_var < m_max:
+        tries += 1
+        if not oracle(m_var):
+            m_max = m_var
+            break
+        m_min = m_var
+        m_var *= 2
+    while m_max - m_min > m_min * accuracy:
+        tries += 1
+        m_var = (m_min + m_max) / 2
+        if oracle(m_var):
+            m_min = m_var
+        else:
+            m_max = m_var
+    return m_min, tries, tries + 1
+
+def search_bisect_repeat(oracle, m_min, m_max, accuracy, repeats=3):
+    # Bisect, only accepting a value when the majority of repeats pass
+    tries = 0
+    while m_max - m_min > m_min * accuracy:
+        m_var = (m_min + m_max) / 2
+        passed = 0
+        for i in range(repeats):
+            tries += 1
+            passed += oracle(m_var)
+            failed = i + 1 - passed
+            if passed > repeats // 2 or failed > repeats // 2:
+                break
+        if passed > repeats // 2:
+            m_min = m_var
+        else:
+            m_max = m_var
+    return m_min, tries, tries + 1
+
+def search_bayes(oracle, m_min, m_max, accuracy, error=0.05, confidence=0.8, max_tries=50):
+    # Probabilistic bisection, test the posterior median of the limit
+    #  Bins are log spaced at a quarter of accuracy, so the interval can get within accuracy anywhere
+    ratio = 1 + accuracy / 4
+    bins = max(int(math.ceil(math.log(m_max / m_min) / math.log(ratio))), 2)
+    values = [m_min * ratio**(i + 0.5) for i in range(bins)]
+    post = [1.0 / bins] * bins
+    tries = 0
+
+    def quantile(q):
+        total = 0.0
+        for i, p in enumerate(post):
+            total += p
+            if total >= q:
+                return values[i]
+        return values[-1]
+
+    while tries < max_tries:
+        lower = quantile((1 - confidence) / 2)
+        upper = quantile((1 + confidence) / 2)
+        if upper <= lower * (1 + accuracy):
+            break
+        median = quantile(0.5)
+        tries += 1
+        if oracle(median): # limit is above median
+            post = [p * ((1 - error) if v > median else error) for p, v in zip(post, values)]
+        else:
+            post = [p * (error if v > median else (1 - error)) for p, v in zip(post, values)]
+        total = sum(post)
+        post = [p / total for p in post]
+    return quantile(0.5), tries, tries + 1
+
+STRATEGIES = {
+    "binary": search_binary,
+    "ladder": partial(search_binary, ladder=3),
+    "gallop": search_gallop,
+    "bisect_repeat": search_bisect_repeat,
+    "bayes": search_bayes,
+}
+
+# -------------------------------------------------------
+#
+#     Replay
+#
+# -------------------------------------------------------
+def replay(model: AxisModel, strategy: str, m_min, m_max, accuracy, time_home, time_move, trials=200, seed=0):
+    rng = random.Random(seed)
+    search = STRATEGIES[strategy]
+    attempts = homes = error = 0.0
+    for _ in range(trials):
+        result, tries, home = search(model.oracle(rng), m_min, m_max, accuracy)
+        attempts += tries
+        homes += home
+        error += abs(result - model.limit) / model.limit
+    attempts /= trials
+    homes /= trials
+    return {
+        "strategy": strategy,
+        "attempts": attempts,
+        "homes": homes,
+        "time": homes * time_home + attempts * time_move,
+        "error": error / trials,
+    }
+
+def compare(attempts: list, strategies=None, trials=200, max_missed=None, seed=0):
+    if strategies is None:
+        strategies = list(STRATEGIES.keys())
+    time_home, time_move = attempt_times(attempts)
+    results = {}
+    groups = group_attempts(attempts)
+    for key, model in build_models(attempts, max_missed).items():
+        first = groups[key][0]
+        m_min = first["min"] if first.get("min") else model.lo
+        m_max = first["max"] if first.get("max") else model.hi
+        accuracy = first.get("accuracy") or 0.05
+        results[key] = (model, [
+            replay(model, s, m_min, m_max, accuracy, time_home, time_move, trials, seed)
+            for s in strategies
+        ])
+    return results
+
+def format_results(results: dict):
+    respond = ""
+    for key, (model, rows) in results.items():
+        respond += f"{key}: limit {model.limit:.0f} from {len(model.samples)} samples\n"
+        for row in rows:
+            respond += f"| {row['strategy']:<14} {row['attempts']:5.1f} tries, {row['homes']:5.1f} homes, {row['time']:7.1f}s, {row['error']*100:5.1f}% error\n"
+    return respond
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Replay recorded AUTO_SPEED attempts against alternative search strategies")
+    parser.add_argument("file", help="Attempt log, auto_speed_attempts.jsonl")
+    parser.add_argument("--trials", type=int, default=200)
+    parser.add_argument("--max-missed", type=float, default=None)
+    parser.add_argument("--strategies", default=",".join(STRATEGIES.keys()))
+    args = parser.parse_args()
+    print(format_results(compare(
+        load_attempts(args.file),
+        strategies=[s for s in args.strategies.split(",") if s in STRATEGIES],
+        trials=args.trials,
+        max_missed=args.max_missed,
+    )), end="")
@@ -0,0 +1,95 @@
+# Find your printers max speed before losing steps
+#
+# Copyright (C) 2024 Anonoei <dev@anonoei.com>
+#
+# This file may be distributed under the terms of the MIT license.
+
+import os
+import re
+import glob
+import math
+
+# Same empirical smoothing target klipper's shaper_calibrate uses for max_accel
+TARGET_SMOOTHING = 0.12
+DEFAULT_DAMPING = 0.1
+
+def shaper_smoothing(shaper, accel: float, scv: float):
+    # Ported from klipper's ShaperCalibrate._get_shaper_smoothing
+    half_accel = accel * .5
+    A, T = shaper
+    inv_D = 1. / sum(A)
+    n = len(T)
+    ts = sum([A[i] * T[i] for i in range(n)]) * inv_D
+    offset_90 = offset_180 = 0.
+    for i in range(n):
+        if T[i] >= ts:
+            offset_90 += A[i] * (scv + half_accel * (T[i]-ts)) * (T[i]-ts)
+        offset_180 += A[i] * half_accel * (T[i]-ts)**2
+    offset_90 *= inv_D * math.sqrt(2.)
+    offset_180 *= inv_D
+    return max(offset_90, offset_180)
+
+def shaper_max_accel(shaper, scv: float):
+    # Ported from klipper's ShaperCalibrate._bisect
+    def func(accel):
+        return shaper_smoothing(shaper, accel, scv) <= TARGET_SMOOTHING
+    left = right = 1.
+    if not func(1e-9):
+        return 0.
+    while not func(left):
+        right = left
+        left *= .5
+    if right == left:
+        while func(right):
+            right *= 2.
+    while right - left > 1e-8:
+        middle = (left + right) * .5
+        if func(middle):
+            left = middle
+        else:
+            right = middle
+    return left
+
+def get_shaper(shaper_type: str, freq: float, damping: float):
+    from .. import shaper_defs # this only works when linked into klippy/extras
+    for s in shaper_defs.INPUT_SHAPERS:
+        if s.name == shaper_type:
+            return s.init_func(freq, damping)
+    return None
+
+def read_config(raw_config: dict):
+    # Returns {axis: (shaper_type, freq, damping)} from [input_shaper]
+    shapers = {}
+    section = raw_config.get("input_shaper", None)
+    if section is None:
+        return shapers
+    for axis in ("x", "y"):
+        freq = float(section.get(f"shaper_freq_{axis}", 0.))
+        if freq <= 0.:
+            continue
+        shaper_type = section.get(f"shaper_type_{axis}", section.get("shaper_type", "mzv")).lower()
+        damping = float(section.get(f"damping_ratio_{axis}", DEFAULT_DAMPING))
+        shapers[axis] = (shaper_type, freq, damping)
+    return shapers
+
+def read_csv(path: str, shaper_type: str = "mzv"):
+    # SHAPER_CALIBRATE output header has a column per shaper, like 'mzv(53.8)'
+    with open(path, "r") as f:
+        header = f.readline().strip().split(",")
+    for col in header:
+        match = re.match(r"^(\w+)\(([\d.]+)\)$", col.strip())
+        if match and match.group(1) == shaper_type:
+            return float(match.group(2))
+    return None
+
+def find_csvs(csv_dir: str, shaper_type: str = "mzv"):
+    # Returns {axis: (shaper_type, freq, damping)} from the newest resonance CSVs
+    shapers = {}
+    for axis in ("x", "y"):
+        paths = glob.glob(os.path.join(csv_dir, f"calibration_data_{axis}_*.csv"))
+        if not paths:
+            continue
+        freq = read_csv(max(paths, key=os.path.getmtime), shaper_type)
+        if freq is not None:
+            shapers[axis] = (shaper_type, freq, DEFAULT_DAMPING)
+    return shapers
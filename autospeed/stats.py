@@ -0,0 +1,117 @@
+# Find your printers max speed before losing steps
+#
+# Copyright (C) 2024 Anonoei <dev@anonoei.com>
+#
+# This file may be distributed under the terms of the MIT license.
+
+from time import perf_counter, process_time
+
+# Above these a failure is blamed on step generation instead of the motors
+STEP_RATE_LIMITED = 0.8 # of max step rate
+MCU_LOAD_LIMITED = 0.8  # mcu_awake
+HOST_LOAD_LIMITED = 0.9 # host cpu
+
+def parse_mcu_stats(stats: str):
+    # 'mcu: mcu_awake=0.003 mcu_task_avg=0.000010 ... ready_bytes=0 upcoming_bytes=0'
+    vals = {}
+    for part in stats.split():
+        if "=" not in part:
+            continue
+        k, v = part.split("=", 1)
+        try:
+            vals[k] = float(v)
+        except ValueError:
+            pass
+    return vals
+
+class LoadSampler:
+    def __init__(self, printer):
+        self.printer = printer
+        self.reactor = printer.get_reactor()
+        self.mcus = [mcu for _, mcu in printer.lookup_objects(module='mcu')]
+        self.time_start = 0.0
+        self.cpu_start = 0.0
+        self.stats_start = []
+
+    def _mcu_stats(self):
+        eventtime = self.reactor.monotonic()
+        return [parse_mcu_stats(mcu.stats(eventtime)[1]) for mcu in self.mcus]
+
+    def start(self):
+        self.stats_start = self._mcu_stats()
+        self.cpu_start = process_time()
+        self.time_start = perf_counter()
+
+    def stop(self):
+        wall = perf_counter() - self.time_start
+        cpu = process_time() - self.cpu_start
+        load = {
+            "host_cpu": cpu / wall if wall > 0 else 0.0,
+            "mcu_awake": 0.0,
+            "mcu_task_avg": 0.0,
+            "upcoming_bytes": 0.0,
+            "retransmit": 0.0,
+        }
+        for start, stop in zip(self.stats_start, self._mcu_stats()):
+            load["mcu_awake"] = max(load["mcu_awake"], stop.get("mcu_awake", 0.0))
+            load["mcu_task_avg"] = max(load["mcu_task_avg"], stop.get("mcu_task_avg", 0.0))
+            load["upcoming_bytes"] = max(load["upcoming_bytes"], stop.get("upcoming_bytes", 0.0))
+            load["retransmit"] += stop.get("bytes_retransmit", 0.0) - start.get("bytes_retransmit", 0.0)
+        return load
+
+def classify(load: dict):
+    if load.get("step_rate", 0.0) > STEP_RATE_LIMITED:
+        return "step-rate limited"
+    if load.get("mcu_awake", 0.0) > MCU_LOAD_LIMITED:
+        return "step-rate limited"
+    if load.get("host_cpu", 0.0) > HOST_LOAD_LIMITED:
+        return "step-rate limited"
+    if load.get("retransmit", 0.0) > 0:
+        return "step-rate limited"
+    return "torque limited"
+
+# Below this fraction of the commanded velocity/accel a test didn't really run at it
+MOTION_REACHED = 0.98
+
+def read_motion(printer, strokes: list):
+    """Planned motion of each test stroke, read back from the toolhead trapq
+
+    strokes are (start print time, end print time, velocity, accel). Returns
+    None when motion_report isn't available. reached is None when a stroke
+    wasn't in the trapq anymore, it's unknown rather than missed.
+    """
+    motion_report = printer.lookup_object('motion_report', None)
+    if motion_report is None or 'toolhead' not in motion_report.trapqs:
+        return None
+    dump = motion_report.trapqs['toolhead']
+    motion = {
+        "peak_veloc": 0.0,
+        "peak_accel": 0.0,
+        "time_accel": 0.0,
+        "time_cruise": 0.0,
+        "time_decel": 0.0,
+        "reached": True,
+    }
+    unknown = False
+    for start, end, veloc, accel in strokes:
+        moves, _ = dump.extract_trapq(start, end)
+        if not moves:
+            unknown = True
+            continue
+        peak_veloc = peak_accel = 0.0
+        for move in moves:
+            peak_veloc = max(peak_veloc, move.start_v, move.start_v + move.accel * move.move_t)
+            if move.accel > 0.0:
+                peak_accel = max(peak_accel, move.accel)
+                motion["time_accel"] += move.move_t
+            elif move.accel < 0.0:
+                motion["time_decel"] += move.move_t
+            else:
+                motion["time_cruise"] += move.move_t
+        motion["peak_veloc"] = max(motion["peak_veloc"], peak_veloc)
+        motion["peak_accel"] = max(motion["peak_accel"], peak_accel)
+        if peak_veloc < veloc * MOTION_REACHED or peak_accel < accel * MOTION_REACHED:
+            motion["reached"] = False
+    if unknown and motion["reached"]:
+        motion["reached"] = None
+    return motion
@@ -0,0 +1,92 @@
+# Find your printers max speed before losing steps
+#
+# Copyright (C) 2024 Anonoei <dev@anonoei.com>
+#
+# This file may be distributed under the terms of the MIT license.
+
+import re
+import itertools
+
+PARAM = re.compile(r"([A-Z])\s*([-+]?[\d.]+)")
+
+def parse_moves(f):
+    """Yield the absolute (x, y) end of every XY move in a G-code stream
+
+    Only the current position is kept, so files of any size are read
+    in constant memory. Extrusion, feedrates and Z are ignored.
+    """
+    absolute = True
+    pos = [None, None]    # G-code coordinates
+    offset = [0.0, 0.0]   # G92 offset, machine = G-code + offset
+    for line in f:
+        line = line.split(";", 1)[0].strip().upper()
+        if not line:
+            continue
+        params = PARAM.findall(line)
+        if not params:
+            continue
+        cmd = params[0][0] + params[0][1]
+        if cmd in ("G90",):
+            absolute = True
+        elif cmd in ("G91",):
+            absolute = False
+        elif cmd == "G92":
+            for key, value in params[1:]:
+                if key in ("X", "Y"):
+                    i = "XY".index(key)
+                    machine = pos[i] + offset[i] if pos[i] is not None else None
+                    pos[i] = float(value)
+                    if machine is not None:
+                        offset[i] = machine - pos[i]
+        elif cmd in ("G0", "G1", "G00", "G01", "G2", "G3", "G02", "G03"):
+            # Arcs are replayed as a line to their end point
+            moved = False
+            for key, value in params[1:]:
+                if key in ("X", "Y"):
+                    i = "XY".index(key)
+                    if absolute:
+                        pos[i] = float(value)
+                    elif pos[i] is not None:
+                        pos[i] += float(value)
+                    moved = True
+            if moved and pos[0] is not None and pos[1] is not None:
+                yield pos[0] + offset[0], pos[1] + offset[1]
+
+def window(path: str, start: int, count: int):
+    # Moves start to start+count of the file, reopened so it can be read twice
+    with open(path, "r", errors="ignore") as f:
+        for move in itertools.islice(parse_moves(f), start, start + count):
+            yield move
+
+def bounds(moves):
+    x_min = y_min = float("inf")
+    x_max = y_max = float("-inf")
+    count = 0
+    for x, y in moves:
+        x_min, x_max = min(x_min, x), max(x_max, x)
+        y_min, y_max = min(y_min, y), max(y_max, y)
+        count += 1
+    return (x_min, x_max, y_min, y_max), count
+
+def fit(box: tuple, area: tuple, scale: bool):
+    """Returns (factor, dx, dy) placing box inside area
+
+    Moves are only ever shrunk, so segment lengths stay as close to the print as possible.
+    Returns None if box isn't inside area, and scale isn't allowed.
+    """
+    x_min, x_max, y_min, y_max = box
+    a_x_min, a_x_max, a_y_min, a_y_max = area
+    if x_min >= a_x_min and x_max <= a_x_max and y_min >= a_y_min and y_max <= a_y_max:
+        return 1.0, 0.0, 0.0 # Already inside, replay where it was printed
+    if not scale:
+        return None
+    width, height = x_max - x_min, y_max - y_min
+    factor = 1.0
+    if width > 0:
+        factor = min(factor, (a_x_max - a_x_min) / width)
+    if height > 0:
+        factor = min(factor, (a_y_max - a_y_min) / height)
+    # Center the scaled box in the area
+    dx = (a_x_min + a_x_max) / 2 - (x_min + x_max) / 2 * factor
+    dy = (a_y_min + a_y_max) / 2 - (y_min + y_max) / 2 * factor
+    return factor, dx, dy
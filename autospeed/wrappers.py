@@ -11,6 +11,7 @@ class ResultsWrapper:
         self.name: str = ""
         self.duration: float = None
         self.vals: dict = {}
+        self.limited: dict = {}
 
     def __str__(self):
         fmt = f"ResultsWrapper {self.name}, duration: {self.duration}\n"
@@ -27,6 +28,20 @@ class ResultsWrapper:
         self.vals = newVals
         self.vals["rec"] = min(vList)
 
+    def limit(self, limits: dict):
+        # Cap derated values by another limit, like the input shaper's
+        vList = []
+        for k, v in limits.items():
+            if self.vals.get(k, None) is None:
+                continue
+            self.vals[f"limit_{k}"] = v
+            self.vals[k] = min(self.vals[k], v)
+        for k, v in self.vals.items():
+            if k == "rec" or k.startswith("max_") or k.startswith("limit_"):
+                continue
+            vList.append(v)
+        self.vals["rec"] = min(vList)
+
 class AttemptWrapper:
     def __init__(self):
         self.type: str = ""
@@ -39,6 +54,12 @@ class AttemptWrapper:
         self.accel: float = 0.0
         self.veloc: float = 0.0
         self.scv: float = 0
+        self.cruise_ratio: float = 0.0
+        self.fixed: bool = None # accel/veloc was given, instead of following the search
+        self.ladder: int = 1 # Most test moves per homing cycle
+        self.ladder_values: list = [] # Values tested by the last ladder attempt
+        self.run: str = None # Search the attempts belong to, None outside binary_search
+        self.search_max: float = None # binary_search's current upper bound
         
         self.home_steps: float = None
         
@@ -47,9 +68,15 @@ class AttemptWrapper:
         self.move_dist: float = 0.0
         self.move_valid = True
         self.move_missed: dict = None
+        self.missed: dict = {}
         self.move_time_prehome: float = 0.0
         self.move_time: float = 0.0
+        self.move_print_time: float = 0.0 # Planned duration of the test move
         self.move_time_posthome: float = 0.0
+        self.move_time_sync: float = 0.0 # Blocked waiting on the toolhead
+        self.load: dict = {}
+        self.motion: dict = {} # Planned motion read back from the trapq
+        self.limited: str = None # What stopped the last failed attempt
         self.time_start: float = 0.0
         self.time_last: float = 0.0
         self.time_total: float = 0.0
@@ -63,3 +90,32 @@ class AttemptWrapper:
         fmt += f"| Valid: {self.move_valid}, Dist: {self.move_dist:.0f}\n"
         fmt += f"| Times: {self.move_time_prehome:.2f}/{self.move_time:.2f}/{self.move_time_posthome:.2f}s over {self.time_last:.2f}"
         return fmt
+
+    def record(self, valid: bool):
+        return {
+            "type": self.type,
+            "axis": self.axis,
+            "run": self.run,
+            "fixed": self.fixed,
+            "try": self.tries,
+            "min": self.min,
+            "max": self.max,
+            "accuracy": self.accuracy,
+            "max_missed": self.max_missed,
+            "accel": self.accel,
+            "veloc": self.veloc,
+            "scv": self.scv,
+            "cruise_ratio": self.cruise_ratio,
+            "ladder": list(self.ladder_values),
+            "dist": self.move_dist,
+            "missed": dict(self.missed),
+            "valid": valid,
+            "load": dict(self.load),
+            "motion": dict(self.motion),
+            "time_prehome": self.move_time_prehome,
+            "time_move": self.move_time,
+            "time_move_print": self.move_print_time,
+            "time_posthome": self.move_time_posthome,
+            "time_sync": self.move_time_sync,
+            "time_last": self.time_last,
+        }
@@ -0,0 +1,77 @@
+# Find your printers max speed before losing steps
+#
+# Copyright (C) 2024 Anonoei <dev@anonoei.com>
+#
+# This file may be distributed under the terms of the MIT license.
+"""Startup and homing cost of Auto Speed, run from the repository root
+
+    python benchmarks/import_time.py
+"""
+
+import os
+import sys
+import statistics
+import subprocess
+from time import perf_counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules klippy has already imported by the time [auto_speed] loads
+KLIPPY_PRELOADED = "import os, sys, math, re, json, time, datetime, logging, collections"
+
+def import_time(repeat: int, statement: str):
+    code = (
+        f"{KLIPPY_PRELOADED}\n"
+        "start = time.perf_counter()\n"
+        f"{statement}\n"
+        "took = time.perf_counter() - start\n"
+        "loaded = sorted(m for m in sys.modules if m.startswith('autospeed.') or m in ('sqlite3', 'numpy', 'matplotlib', 'csv'))\n"
+        "print(took, ','.join(loaded))\n"
+    )
+    times = []
+    loaded = ""
+    for _ in range(repeat):
+        out = subprocess.check_output([sys.executable, "-c", code], cwd=ROOT, text=True).split()
+        times.append(float(out[0]))
+        loaded = out[1] if len(out) > 1 else ""
+    return times, loaded
+
+class FakePrintStats:
+    def get_status(self, eventtime):
+        return {"state": "standby", "filename": "", "print_duration": 0.0}
+
+class FakeReactor:
+    def monotonic(self):
+        return 0.0
+
+class FakePrinter:
+    def get_reactor(self):
+        return FakeReactor()
+    def lookup_object(self, name, default=None):
+        return FakePrintStats() if name == "print_stats" else default
+
+def hook_time(calls: int):
+    # handle_home_rails_end is only registered with the print monitor,
+    #  time it outside of a print, after steppers were captured
+    sys.path.insert(0, ROOT)
+    from autospeed import AutoSpeed
+    from autospeed.monitor import PrintMonitor
+    autospeed = AutoSpeed.__new__(AutoSpeed)
+    autospeed.printer = FakePrinter()
+    autospeed.steppers = {"x": [], "y": [], "z": []}
+    autospeed.monitor = PrintMonitor(autospeed, os.path.join(ROOT, "benchmarks", "unused_monitor.csv"), 20, 1.0)
+    start = perf_counter()
+    for _ in range(calls):
+        autospeed.handle_home_rails_end(None, [])
+    return (perf_counter() - start) / calls
+
+if __name__ == "__main__":
+    times, loaded = import_time(10, "import autospeed")
+    print(f"import autospeed: median {statistics.median(times)*1000:.2f}ms, max {max(times)*1000:.2f}ms")
+    print(f"loaded at startup: {loaded}")
+    # What load_config pulls in for [auto_speed]
+    times, loaded = import_time(10, "import autospeed.main")
+    print(f"import autospeed.main: median {statistics.median(times)*1000:.2f}ms, max {max(times)*1000:.2f}ms")
+    print(f"loaded by load_config: {loaded}")
+    print(f"home_rails_end with monitor, not printing: {hook_time(100000)*1e6:.2f}us per home")
+    print("home_rails_end without monitor: not registered")